@@ -0,0 +1,32 @@
+"""
+ASGI config for the bangazon project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Requests are routed with settings.ASGI_ROOT_URLCONF, which sends the
+read-heavy endpoints to async views. Serve it with any ASGI server, e.g.
+
+    uvicorn bangazon.asgi:application --workers 4
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
+"""
+
+import os
+
+import django
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bangazon.settings')
+django.setup(set_prefix=False)
+
+
+class BangazonASGIHandler(ASGIHandler):
+    """ASGIHandler that resolves URLs with settings.ASGI_ROOT_URLCONF"""
+
+    async def get_response_async(self, request):
+        request.urlconf = getattr(settings, 'ASGI_ROOT_URLCONF', settings.ROOT_URLCONF)
+        return await super().get_response_async(request)
+
+
+application = BangazonASGIHandler()
@@ -0,0 +1,23 @@
+"""URLconf for the ASGI deployment
+
+Read-heavy endpoints are served by async views that use the async ORM.
+Everything else, including writes to the same paths, falls through to the
+regular routes in bangazon/urls.py.
+"""
+from django.urls import re_path
+from bangazonapi.asyncviews import async_viewset_view
+from bangazonapi.views import ProductCategories, Products, Profile
+from .urls import urlpatterns as sync_urlpatterns
+
+
+def async_view(viewset_class, actions):
+    return async_viewset_view(viewset_class, actions, fallback_urlconf='bangazon.urls')
+
+
+# pylint: disable=invalid-name
+urlpatterns = [
+    re_path(r'^products$', async_view(Products, {'get': 'alist'})),
+    re_path(r'^products/(?P<pk>[0-9]+)$', async_view(Products, {'get': 'aretrieve'})),
+    re_path(r'^productcategories$', async_view(ProductCategories, {'get': 'alist'})),
+    re_path(r'^profile$', async_view(Profile, {'get': 'alist'})),
+] + sync_urlpatterns
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+from importlib.util import find_spec
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -43,21 +44,53 @@ INSTALLED_APPS = [
     'safedelete',
 ]
 
+# MessagePack is negotiated only when the optional msgpack package is
+# installed, see bangazonapi/renderers.py
+if find_spec('msgpack') is not None:
+    MSGPACK_RENDERER_CLASSES = ('bangazonapi.renderers.MessagePackRenderer',)
+    MSGPACK_PARSER_CLASSES = ('bangazonapi.renderers.MessagePackParser',)
+else:
+    MSGPACK_RENDERER_CLASSES = MSGPACK_PARSER_CLASSES = ()
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'bangazonapi.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
-    ),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
+        'bangazonapi.renderers.ORJSONRenderer',
+    ) + MSGPACK_RENDERER_CLASSES,
+    'DEFAULT_PARSER_CLASSES': (
+        'bangazonapi.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ) + MSGPACK_PARSER_CLASSES,
+    'DEFAULT_PAGINATION_CLASS': 'bangazonapi.pagination.BoundedLimitOffsetPagination',
     'PAGE_SIZE': 10
 }
 
+# Per-process cache of authenticated tokens, see bangazonapi/authentication.py
+TOKEN_AUTH_CACHE_SIZE = 1024
+TOKEN_AUTH_CACHE_TTL = 30
+
+# Times a checkout is tried when SQLite reports the database is locked
+CHECKOUT_ATTEMPTS = 5
+
+# Threads that decode and resize uploaded product images, see
+# bangazonapi/images.py. 0 processes them during the request.
+PRODUCT_IMAGE_WORKERS = 2
+
+# Products kept per product for GET /products/{id}/similar
+SIMILAR_PRODUCTS_COUNT = 20
+
+# Upper bound on ?limit= for every paginated list endpoint
+MAX_PAGE_SIZE = 100
+
 MIDDLEWARE = [
+    'bangazonapi.middleware.RequestInstrumentationMiddleware',
+    'bangazonapi.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -68,6 +101,36 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Responses smaller than this many bytes are not compressed, see
+# CompressionMiddleware in bangazonapi/middleware.py
+COMPRESSION_MIN_SIZE = 1024
+
+# Report query count, SQL time and view time for every request as a
+# Server-Timing header and a log line on the `bangazonapi.requests` logger.
+# Turn this on in development and staging.
+REQUEST_INSTRUMENTATION = False
+
+# Log a warning for any request that runs more queries than this (None to disable)
+REQUEST_QUERY_THRESHOLD = 20
+
+# Set BANGAZON_LOG_LEVEL=INFO to see a line per request when
+# REQUEST_INSTRUMENTATION is on
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'bangazonapi': {
+            'handlers': ['console'],
+            'level': os.environ.get('BANGAZON_LOG_LEVEL', 'WARNING'),
+        },
+    },
+}
+
 CORS_ORIGIN_WHITELIST = (
     'http://localhost:3000',
     'http://127.0.0.1:3000'
@@ -93,6 +156,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'bangazon.wsgi.application'
 
+# Used by bangazon/asgi.py. Routes the read endpoints to async views.
+ASGI_ROOT_URLCONF = 'bangazon.asgi_urls'
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
@@ -107,6 +173,30 @@ DATABASES = {
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
 
 
+# Caches
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+#
+# `responses` holds the read-through API response cache (bangazonapi/cache.py).
+# Local memory is per process and evicts least recently used entries past
+# MAX_ENTRIES. Switch to a shared backend when running several workers, e.g.
+#     'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#     'LOCATION': os.path.join(BASE_DIR, '.cache', 'responses'),
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bangazon-responses',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -138,3 +228,13 @@ APPEND_SLASH = False
 
 MEDIA_ROOT = 'media'
 MEDIA_URL = '/media/'
+
+# How bangazonapi.media.serve_media sends files: None sends them from
+# Django, 'x-sendfile' (Apache, lighttpd) or 'x-accel-redirect' (nginx)
+# leaves it to the web server. For nginx, map the prefix to MEDIA_ROOT:
+#
+#     location /protected-media/ { internal; alias /srv/bangazon/media/; }
+MEDIA_SENDFILE = None
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+# Cache lifetime of media files whose names do not contain a content hash
+MEDIA_MAX_AGE = 3600
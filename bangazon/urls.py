@@ -1,8 +1,8 @@
 from django.conf import settings
-from django.urls import include, path
-from django.conf.urls.static import static
+from django.urls import include, path, re_path
 from rest_framework import routers
 from rest_framework.authtoken.views import obtain_auth_token
+from bangazonapi.media import serve_media
 from bangazonapi.models import *
 from bangazonapi.views import *
 
@@ -27,4 +27,5 @@ urlpatterns = [
     path('login', login_user),
     path('api-token-auth', obtain_auth_token),
     path('api-auth', include('rest_framework.urls', namespace='rest_framework')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    re_path(rf'^{settings.MEDIA_URL.strip("/")}/(?P<path>.+)$', serve_media),
+]
@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class BangazonapiConfig(AppConfig):
     name = 'bangazonapi'
+
+    def ready(self):
+        # Connect the signal handlers that keep denormalized data in sync
+        from . import signals  # pylint: disable=unused-import,import-outside-toplevel
+        from .search import create_search_index  # pylint: disable=import-outside-toplevel
+
+        post_migrate.connect(create_search_index, sender=self)
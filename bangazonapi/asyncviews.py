@@ -0,0 +1,102 @@
+"""Serve viewset coroutine methods as Django async views
+
+Django REST framework views are synchronous. Under ASGI, Django runs every
+sync view in one shared thread, so concurrent requests queue behind each
+other. async_viewset_view() builds an async Django view that runs the same
+request pipeline as a ViewSet (content negotiation, authentication,
+permissions, throttles, exception handling and rendering) around one of the
+viewset's coroutine methods, such as Products.alist.
+
+Methods the view has no coroutine for are passed to the sync view that
+the regular URLconf routes the path to, so writes keep working.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.urls import resolve
+
+
+async def authenticate(request):
+    """Run the request's authenticators, awaiting those that support it"""
+    for authenticator in request.authenticators:
+        try:
+            if hasattr(authenticator, 'aauthenticate'):
+                user_auth_tuple = await authenticator.aauthenticate(request)
+            else:
+                user_auth_tuple = await sync_to_async(authenticator.authenticate)(request)
+        except Exception:
+            request._not_authenticated()
+            raise
+
+        if user_auth_tuple is not None:
+            request._authenticator = authenticator
+            request.user, request.auth = user_auth_tuple
+            return
+
+    request._not_authenticated()
+
+
+def detach(response):
+    """Render a DRF response into a plain HttpResponse
+
+    Django renders template responses in the sync thread, so hand it one
+    that is already rendered instead.
+    """
+    if not hasattr(response, 'render'):
+        return response
+
+    response.render()
+    plain = HttpResponse(response.content, status=response.status_code)
+    for header, value in response.items():
+        plain[header] = value
+    return plain
+
+
+def async_viewset_view(viewset_class, actions, fallback_urlconf=None):
+    """Async view running `viewset_class` coroutine methods
+
+    Arguments:
+        viewset_class -- ViewSet with coroutine methods to serve
+        actions -- Maps lowercase HTTP methods to coroutine method names,
+            e.g. {'get': 'alist'}
+        fallback_urlconf -- URLconf that routes other methods to sync views.
+            Defaults to settings.ROOT_URLCONF.
+
+    Returns:
+        Async view function
+    """
+    async def view(request, *args, **kwargs):
+        action = actions.get(request.method.lower())
+        if action is None:
+            match = resolve(request.path_info, urlconf=fallback_urlconf or settings.ROOT_URLCONF)
+            return await sync_to_async(match.func)(request, *match.args, **match.kwargs)
+
+        self = viewset_class()
+        self.action_map = actions
+        self.action = action
+        self.args = args
+        self.kwargs = kwargs
+        self.headers = self.default_response_headers
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+
+        try:
+            self.format_kwarg = self.get_format_suffix(**kwargs)
+            request.accepted_renderer, request.accepted_media_type = \
+                self.perform_content_negotiation(request)
+            request.version, request.versioning_scheme = \
+                self.determine_version(request, *args, **kwargs)
+            await authenticate(request)
+            self.check_permissions(request)
+            self.check_throttles(request)
+
+            response = await getattr(self, action)(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        return detach(self.finalize_response(request, response, *args, **kwargs))
+
+    view.csrf_exempt = True
+    view.cls = viewset_class
+    view.actions = actions
+    return view
@@ -0,0 +1,195 @@
+"""Token authentication that resolves the customer in the same query
+
+TokenAuthentication runs a token and user join on every request, and the
+views then look up the customer separately. CachedTokenAuthentication loads
+token, user and customer together, keeps the rows in a small per-process
+LRU cache with a short TTL, and attaches the customer as `request.customer`.
+
+Entries are dropped when their token is deleted or their user or customer
+changes (see bangazonapi/signals.py). Other processes only notice such a
+change when their entry expires, so keep TOKEN_AUTH_CACHE_TTL short.
+"""
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+from bangazonapi.models import Customer
+
+
+def _field_names(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def _values(instance):
+    return tuple(getattr(instance, name) for name in _field_names(type(instance)))
+
+
+def _rebuild(model, values):
+    return model.from_db(DEFAULT_DB_ALIAS, _field_names(model), values)
+
+
+class TokenCache:
+    """Bounded, thread safe LRU of token rows that expire after a TTL
+
+    Row values are cached rather than model instances, and fresh instances
+    are built on every hit, so one request can never see another request's
+    changes to a shared object.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Cached (token, user, customer) row values for a key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, _, rows = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return rows
+
+    def set(self, key, rows):
+        size = getattr(settings, 'TOKEN_AUTH_CACHE_SIZE', 1024)
+        ttl = getattr(settings, 'TOKEN_AUTH_CACHE_TTL', 30)
+        user_id = rows[0][_field_names(Token).index('user_id')]
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, user_id, rows)
+            self._entries.move_to_end(key)
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+
+    def forget_token(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def forget_user(self, user_id):
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry[1] == user_id]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that also sets request.customer
+
+    `request.customer` is None for anonymous requests and for users, such as
+    staff accounts, that have no customer profile. Async views authenticate
+    with aauthenticate(), which uses the async ORM on a cache miss.
+    """
+
+    def authenticate(self, request):
+        request.customer = None
+        key = self.token_key(request)
+        if key is None:
+            return None
+        return self.attach_customer(request, self.authenticate_credentials(key))
+
+    async def aauthenticate(self, request):
+        request.customer = None
+        key = self.token_key(request)
+        if key is None:
+            return None
+
+        rows = token_cache.get(key)
+        if rows is None:
+            rows = await self.aload(key)
+            token_cache.set(key, rows)
+        return self.attach_customer(request, self.credentials_from_rows(rows))
+
+    def authenticate_credentials(self, key):
+        rows = token_cache.get(key)
+        if rows is None:
+            rows = self.load(key)
+            token_cache.set(key, rows)
+        return self.credentials_from_rows(rows)
+
+    def token_key(self, request):
+        """The key sent in the Authorization header, or None if there is none"""
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+
+        if len(auth) == 1:
+            raise exceptions.AuthenticationFailed(_('Invalid token header. No credentials provided.'))
+        if len(auth) > 2:
+            raise exceptions.AuthenticationFailed(
+                _('Invalid token header. Token string should not contain spaces.'))
+
+        try:
+            return auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(
+                _('Invalid token header. Token string should not contain invalid characters.'))
+
+    @staticmethod
+    def attach_customer(request, credentials):
+        try:
+            request.customer = credentials[0].customer
+        except Customer.DoesNotExist:
+            pass
+        return credentials
+
+    @staticmethod
+    def credentials_from_rows(rows):
+        """Fresh (user, token) instances built from cached row values"""
+        token_values, user_values, customer_values = rows
+        token = _rebuild(Token, token_values)
+        user = _rebuild(User, user_values)
+        token.user = user
+
+        if customer_values is None:
+            # Remember there is no customer, so user.customer does not query
+            User.customer.related.set_cached_value(user, None)
+        else:
+            # Also caches the customer as user.customer
+            _rebuild(Customer, customer_values).user = user
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        return (user, token)
+
+    @staticmethod
+    def load(key):
+        """Row values of the token, its user and their customer, in one query"""
+        try:
+            token = Token.objects.select_related('user__customer').get(key=key)
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        return _token_rows(token)
+
+    @staticmethod
+    async def aload(key):
+        """load() using the async ORM"""
+        try:
+            token = await Token.objects.select_related('user__customer').aget(key=key)
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        return _token_rows(token)
+
+
+def _token_rows(token):
+    try:
+        customer_values = _values(token.user.customer)
+    except Customer.DoesNotExist:
+        customer_values = None
+
+    return (_values(token), _values(token.user), customer_values)
@@ -0,0 +1,138 @@
+"""Versioned read-through cache for API response data
+
+Every cached response belongs to one or more scopes, such as
+`product:12` or `productcategories`. Each scope has a version token stored
+in the cache, and the versions are part of the response key. Bumping a
+scope's version makes every response built from it unreachable, and the
+backend's TTL and LRU culling then evict those stale entries.
+
+Responses are cached in the `responses` alias of settings.CACHES. Use a
+backend that all workers share (file based, memcached, redis) when running
+more than one process, so that a bump in one worker is seen by all of them.
+"""
+import hashlib
+import uuid
+from django.core.cache import caches
+from django.db import transaction
+
+
+CACHE_ALIAS = 'responses'
+
+# Bumped when every product may have changed, e.g. after an aggregate rebuild
+PRODUCTS = 'products'
+# Bumped whenever any single product changes
+PRODUCT_LIST = 'productlist'
+PRODUCT_CATEGORIES = 'productcategories'
+# Bumped when every seller's sales may have changed, e.g. after a backfill
+SALES = 'sales'
+
+
+def product_scope(pk):
+    """Scope for everything built from a single product"""
+    return f'product:{pk}'
+
+
+def orders_scope(customer_pk):
+    """Scope for a customer's orders, cart and line items"""
+    return f'orders:{customer_pk}'
+
+
+def customer_scope(pk):
+    """Scope for a customer's profile, payment types and recommendations"""
+    return f'customer:{pk}'
+
+
+def sales_scope(seller_pk):
+    """Scope for a seller's sales rollups"""
+    return f'sales:{seller_pk}'
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _new_token():
+    return uuid.uuid4().hex[:16]
+
+
+def get_versions(*scopes):
+    """Current version token of each scope, created on first use
+
+    Returns:
+        list -- One token per scope, in the order given
+    """
+    cache = _cache()
+    keys = [f'version:{scope}' for scope in scopes]
+    found = cache.get_many(keys)
+
+    versions = []
+    for key in keys:
+        token = found.get(key)
+        if token is None:
+            token = _new_token()
+            if not cache.add(key, token, timeout=None):
+                token = cache.get(key, token)
+        versions.append(token)
+
+    return versions
+
+
+def bump_versions(*scopes):
+    """Invalidate every response built from these scopes
+
+    The bump happens right away, so the current request never reads stale
+    data, and again when the transaction commits, so a reader that cached
+    the old rows in between is discarded too.
+    """
+    def bump():
+        _cache().set_many({f'version:{scope}': _new_token() for scope in scopes}, timeout=None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def read_through(request, scopes, build):
+    """Return cached response data for this request, building it on a miss
+
+    Arguments:
+        request -- The request being answered. Its host and full path are
+            part of the key, since hyperlinks and query params change the body.
+        scopes -- Scopes whose versions the response depends on
+        build -- Callable returning the response data on a cache miss
+
+    Returns:
+        The response data
+    """
+    cache = _cache()
+    key = _response_key(request, scopes)
+
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data)
+
+    return data
+
+
+async def aread_through(request, scopes, build):
+    """read_through() for async views, where `build` is a coroutine function
+
+    The cache is read synchronously. Cache.aget() would run the lookup in
+    the thread shared by all sync code, which costs more than a local or
+    file cache read.
+    """
+    cache = _cache()
+    key = _response_key(request, scopes)
+
+    data = cache.get(key)
+    if data is None:
+        data = await build()
+        cache.set(key, data)
+
+    return data
+
+
+def _response_key(request, scopes):
+    fingerprint = hashlib.sha1(request.build_absolute_uri().encode('utf-8')).hexdigest()
+    versions = '.'.join(get_versions(*scopes))
+    return f'response:{":".join(scopes)}:{versions}:{fingerprint}'
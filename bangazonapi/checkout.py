@@ -0,0 +1,137 @@
+"""Checkout: pay for an open order and take its products out of stock
+
+Stock is taken with one conditional UPDATE per order,
+
+    UPDATE product SET quantity = quantity - CASE id WHEN ... END
+    WHERE id IN (...) AND quantity >= CASE id WHEN ... END
+
+so two buyers can never both get the last item, and no row is read and
+then written back. If any product is short the whole checkout is rolled
+back and the short lines are reported.
+
+Writers on SQLite take turns on the whole database. A checkout that loses
+the race for the lock is retried a few times with a randomized backoff.
+"""
+import random
+import time
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.models import Case, Count, F, IntegerField, Value, When
+from bangazonapi.cache import PRODUCT_LIST, bump_versions, product_scope
+from bangazonapi.models import Order, OrderProduct, Product
+
+
+# Messages of the SQLite errors that mean "try again"
+RETRYABLE_ERRORS = ('database is locked', 'database table is locked', 'database is busy')
+
+
+class CheckoutError(Exception):
+    """The order could not be checked out. Nothing was changed.
+
+    Attributes:
+        failures -- One dict per short product, with the product id and the
+            quantity requested and available. Empty when the order itself
+            could not be paid, e.g. because it already was.
+    """
+
+    def __init__(self, message, failures=()):
+        super().__init__(message)
+        self.failures = list(failures)
+
+
+class _OutOfStock(Exception):
+    """Raised inside the transaction to roll back a partial stock update"""
+
+
+def is_retryable(error):
+    message = str(error).lower()
+    return any(text in message for text in RETRYABLE_ERRORS)
+
+
+def take_stock(quantities):
+    """Decrement stock for every product in one conditional UPDATE
+
+    Arguments:
+        quantities -- dict of product id to the number ordered
+
+    Returns:
+        bool -- Whether every product had enough stock. When it is False some
+            rows may have been decremented, so the caller must roll back.
+    """
+    if not quantities:
+        return True
+
+    ordered = Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+    updated = Product.objects.filter(pk__in=quantities, quantity__gte=ordered).update(
+        quantity=F('quantity') - ordered)
+
+    return updated == len(quantities)
+
+
+def shortages(quantities):
+    """Lines of the order that cannot be filled from current stock"""
+    available = dict(Product.objects.filter(pk__in=quantities).values_list('id', 'quantity'))
+    return [
+        {'product': product_id, 'requested': quantity, 'available': available.get(product_id, 0)}
+        for product_id, quantity in sorted(quantities.items())
+        if available.get(product_id, 0) < quantity
+    ]
+
+
+def checkout(order, payment):
+    """Take the order's products out of stock and mark it paid with `payment`
+
+    Arguments:
+        order -- The open Order to pay for
+        payment -- The Payment used to pay
+
+    Raises:
+        CheckoutError -- If the order was already paid or a product is short
+    """
+    attempts = getattr(settings, 'CHECKOUT_ATTEMPTS', 5)
+    loaded = order.payment_type_id, order._loaded_payment_type_id
+
+    for attempt in range(1, attempts + 1):
+        try:
+            return _checkout_once(order, payment)
+        except OperationalError as ex:
+            # A rollback after the save leaves `order` marked paid, and the
+            # next attempt's save would then not send order_paid
+            order.payment_type_id, order._loaded_payment_type_id = loaded
+            if attempt == attempts or not is_retryable(ex):
+                raise
+            time.sleep(random.uniform(0, 0.01 * 2 ** attempt))
+
+
+def _checkout_once(order, payment):
+    quantities = {}
+
+    try:
+        with transaction.atomic():
+            # Claim the order first. The write also takes the database lock
+            # on SQLite, so its lines and stock cannot change under us.
+            claimed = Order.objects.filter(pk=order.pk, payment_type__isnull=True).update(
+                payment_type=payment)
+            if not claimed:
+                raise CheckoutError('The order has already been paid for.')
+
+            quantities = dict(
+                OrderProduct.objects.filter(order=order)
+                .values_list('product')
+                .annotate(quantity=Count('id'))
+                .order_by('product')
+            )
+            if not take_stock(quantities):
+                raise _OutOfStock()
+
+            # Saving again sends order_paid, which updates sales figures
+            order.payment_type = payment
+            order.save(update_fields=['payment_type'])
+
+    except _OutOfStock:
+        raise CheckoutError('Some products are out of stock.', shortages(quantities))
+
+    bump_versions(PRODUCT_LIST, *[product_scope(product_id) for product_id in quantities])
@@ -0,0 +1,108 @@
+"""Brotli and gzip encoding of response bodies, used by CompressionMiddleware
+
+Brotli needs the brotli package, an optional dependency. Without it only
+gzip is offered.
+"""
+import gzip
+import re
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+GZIP_LEVEL = 6
+# Quality 11 compresses best but is too slow for responses built per request
+BROTLI_QUALITY = 5
+
+# Preferred first when the client accepts several with the same q-value
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+# Media types worth compressing. Images, archives and the like already are.
+COMPRESSIBLE_TYPE = re.compile(
+    r'^(text/[\w.+-]+|application/([\w.-]+\+)?(json|xml)|application/(x-ndjson|javascript)|image/svg\+xml)$')
+
+
+def compressible(content_type):
+    media_type = content_type.split(';', 1)[0].strip().lower()
+    return COMPRESSIBLE_TYPE.match(media_type) is not None
+
+
+def negotiate(accept_encoding):
+    """The encoding to send for an Accept-Encoding header, or None for identity
+
+    Encodings given q=0 are refused, and `*` stands for any encoding not
+    named on its own.
+    """
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, *params = item.split(';')
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name.lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip():
+            qualities[coding.strip().lower()] = quality
+
+    best = None
+    best_quality = 0.0
+    for encoding in ENCODINGS:
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(content, encoding):
+    """Compress a whole body"""
+    if encoding == 'br':
+        return brotli.compress(content, quality=BROTLI_QUALITY)
+    # mtime=0 so the same body always compresses to the same bytes
+    return gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class StreamCompressor:
+    """Compresses a body a chunk at a time
+
+    Each chunk is flushed, so the client receives it as soon as it is
+    produced instead of when the compressor's buffer fills.
+    """
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, chunk):
+        if self.encoding == 'br':
+            return self.compressor.process(chunk) + self.compressor.flush()
+        return self.compressor.compress(chunk) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self.compressor.finish()
+        return self.compressor.flush()
+
+
+def compress_stream(chunks, encoding):
+    compressor = StreamCompressor(encoding)
+    for chunk in chunks:
+        if chunk:
+            yield compressor.compress(chunk)
+    yield compressor.finish()
+
+
+async def acompress_stream(chunks, encoding):
+    compressor = StreamCompressor(encoding)
+    async for chunk in chunks:
+        if chunk:
+            yield compressor.compress(chunk)
+    yield compressor.finish()
@@ -0,0 +1,89 @@
+"""ETag and conditional GET support for viewset read actions
+
+An action's ETag is a hash of the version tokens of the cache scopes its
+response is built from (see bangazonapi/cache.py), together with the URL,
+the caller's token and the negotiated media type. Computing it reads a few
+small cache keys, so a matching If-None-Match is answered with 304 Not
+Modified before any query or serializer runs.
+"""
+import functools
+import hashlib
+import inspect
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+from bangazonapi.cache import get_versions
+
+
+def compute_etag(request, scopes):
+    """Strong ETag for the response to `request` built from `scopes`"""
+    parts = [
+        request.build_absolute_uri(),
+        request.META.get('HTTP_AUTHORIZATION', ''),
+        request.META.get('HTTP_ACCEPT', ''),
+    ] + get_versions(*scopes)
+    digest = hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(request, etag):
+    """Whether If-None-Match names this ETag, using weak comparison"""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+
+    tags = parse_etags(header)
+    return '*' in tags or any(tag.removeprefix('W/') == etag for tag in tags)
+
+
+def conditional(get_scopes):
+    """Decorate a read action so it sends an ETag and honours If-None-Match
+
+    Works on async actions too. get_scopes itself is always synchronous.
+
+    Arguments:
+        get_scopes -- Called with the same (self, request, *args, **kwargs)
+            as the action. Returns the cache scopes the response depends on,
+            or None to skip conditional handling (e.g. anonymous callers).
+    """
+    def decorator(action_method):
+        if inspect.iscoroutinefunction(action_method):
+            @functools.wraps(action_method)
+            async def async_wrapper(self, request, *args, **kwargs):
+                scopes = get_scopes(self, request, *args, **kwargs)
+                if scopes is None:
+                    return await action_method(self, request, *args, **kwargs)
+
+                etag = compute_etag(request, scopes)
+                if etag_matches(request, etag):
+                    return not_modified(etag)
+                return with_etag(await action_method(self, request, *args, **kwargs), etag)
+
+            return async_wrapper
+
+        @functools.wraps(action_method)
+        def wrapper(self, request, *args, **kwargs):
+            scopes = get_scopes(self, request, *args, **kwargs)
+            if scopes is None:
+                return action_method(self, request, *args, **kwargs)
+
+            etag = compute_etag(request, scopes)
+            if etag_matches(request, etag):
+                return not_modified(etag)
+            return with_etag(action_method(self, request, *args, **kwargs), etag)
+
+        return wrapper
+
+    return decorator
+
+
+def not_modified(etag):
+    return with_etag(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+
+
+def with_etag(response, etag):
+    if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept', 'Authorization'))
+    return response
@@ -0,0 +1,110 @@
+"""Streamed catalog export as newline delimited JSON or CSV
+
+Rows are read with QuerySet.iterator() and written out as they arrive, so
+memory use does not grow with the size of the catalog. Output is buffered
+into chunks of about EXPORT_BUFFER_SIZE bytes to keep the number of writes
+to the socket down. The CSV header goes out before the query runs.
+"""
+import csv
+import json
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from bangazonapi.models import Product
+
+
+# Columns of every exported row, in order. These match ProductSerializer,
+# less images, which follows from image_path, and can_be_rated, which
+# depends on who is asking.
+EXPORT_FIELDS = ('id', 'name', 'price', 'number_sold', 'description', 'quantity',
+                 'created_date', 'location', 'image_path', 'average_rating')
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_BUFFER_SIZE = 64 * 1024
+
+
+class NDJSONRenderer(JSONRenderer):
+    """Selects ?format=ndjson. Error responses are a single JSON line."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(data, accepted_media_type, renderer_context) + b'\n'
+
+
+class CSVRenderer(BaseRenderer):
+    """Selects ?format=csv. Error responses are a header row and a value row."""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not data:
+            return b''
+        lines = _CSVLines()
+        return (lines.row(data.keys()) + lines.row(data.values())).encode(self.charset)
+
+
+class _CSVLines:
+    """csv.writer that returns each row as a string instead of writing it"""
+
+    def __init__(self):
+        self.writer = csv.writer(self)
+
+    def write(self, text):
+        return text
+
+    def row(self, values):
+        return self.writer.writerow(values)
+
+
+def export_rows(products, request=None):
+    """Dicts of the EXPORT_FIELDS values, one per product, read in chunks
+
+    Arguments:
+        products -- Product queryset annotated by with_aggregates()
+        request -- Makes image URLs absolute, like ProductSerializer does
+    """
+    storage = Product._meta.get_field('image_path').storage
+
+    for row in products.values(*EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        row['created_date'] = row['created_date'].isoformat()
+        if row['image_path']:
+            url = storage.url(row['image_path'])
+            row['image_path'] = request.build_absolute_uri(url) if request else url
+        else:
+            row['image_path'] = None
+        # values() puts annotations last, so restore the column order
+        yield {field: row[field] for field in EXPORT_FIELDS}
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, separators=(',', ':')) + '\n'
+
+
+def csv_lines(rows):
+    lines = _CSVLines()
+    yield lines.row(EXPORT_FIELDS)
+    for row in rows:
+        yield lines.row(row.values())
+
+
+def buffered(lines, size=EXPORT_BUFFER_SIZE):
+    """Join lines into encoded chunks of about `size` bytes
+
+    The first line is sent on its own, so the response starts right away.
+    """
+    pending = []
+    pending_size = 0
+    first = True
+
+    for line in lines:
+        pending.append(line)
+        pending_size += len(line)
+        if first or pending_size >= size:
+            yield ''.join(pending).encode('utf-8')
+            pending = []
+            pending_size = 0
+            first = False
+
+    if pending:
+        yield ''.join(pending).encode('utf-8')
@@ -0,0 +1,180 @@
+"""Sparse fieldsets: ?fields=, ?omit= and ?expand= on API responses
+
+    GET /products?fields=id,name,price      only these fields
+    GET /products?omit=description          every field but these
+    GET /products?expand=category           add optional nested objects
+
+Each takes a comma separated list of field names, and unknown names give
+a 400. ?fields= and ?omit= apply to the default fields plus the expanded
+ones.
+
+Serializers opt in with DynamicFieldsMixin and list their optional nested
+fields in Meta.expandable_fields. Views pass their queryset through the
+serializer's prune() before evaluating it. That loads only the columns,
+annotations and relations of the fields that will be sent. Two more Meta
+options tell prune() what a field reads when the field name alone does not:
+
+    field_columns     field name to the model fields it reads, for fields
+                      that are not a model field of the same name
+    field_querysets   field name to a function that adds what the field
+                      reads to a queryset, such as an annotation
+
+Only the serializer a view builds reads the query params. Nested
+serializers always send their default fields.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import ParseError
+
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+EXPAND_PARAM = 'expand'
+
+
+class Expandable:
+    """A nested field sent only when named in ?expand=
+
+    Arguments:
+        serializer_class -- Serializer of the related object or objects
+        queryset -- Function that loads the relation for a queryset. By
+            default the field is joined with select_related() if it is a
+            foreign key, and fetched with prefetch_related() otherwise.
+        **kwargs -- Passed on to serializer_class, e.g. many=True
+    """
+
+    def __init__(self, serializer_class, queryset=None, **kwargs):
+        self.serializer_class = serializer_class
+        self.queryset = queryset
+        self.kwargs = kwargs
+
+    def field(self):
+        return self.serializer_class(read_only=True, **self.kwargs)
+
+    def load(self, queryset, name):
+        """Add the related rows of this field to a queryset"""
+        if self.queryset is not None:
+            return self.queryset(queryset)
+        if _is_foreign_key(queryset.model, name):
+            return queryset.select_related(name)
+        return queryset.prefetch_related(name)
+
+
+class FieldSelection:
+    """The fields of a serializer that one request asked for
+
+    Raises:
+        ParseError -- A param names a field the serializer does not have
+    """
+
+    def __init__(self, serializer_class, query_params):
+        meta = serializer_class.Meta
+        self.expandable = getattr(meta, 'expandable_fields', {})
+        self.field_columns = getattr(meta, 'field_columns', {})
+        self.field_querysets = getattr(meta, 'field_querysets', {})
+
+        self.expanded = _names(query_params, EXPAND_PARAM)
+        _check(EXPAND_PARAM, self.expanded, self.expandable)
+
+        available = list(meta.fields) + [name for name in self.expandable if name in self.expanded]
+        only = _names(query_params, FIELDS_PARAM)
+        omit = _names(query_params, OMIT_PARAM)
+        _check(FIELDS_PARAM, only, available)
+        _check(OMIT_PARAM, omit, available)
+
+        self.names = [name for name in available if (not only or name in only) and name not in omit]
+        self.narrowed = bool(only or omit)
+
+    def prune(self, queryset, *keep):
+        """Load what the selected fields read, and nothing they do not
+
+        Columns are only deferred when ?fields= or ?omit= narrowed the
+        selection, so the default response reads whole rows as before.
+
+        Arguments:
+            queryset -- Queryset the serializer will read
+            keep -- Model fields to load anyway, e.g. ones pagination reads
+        """
+        model = queryset.model
+        columns = set(keep)
+        applied = []
+
+        for name in self.names:
+            if name in self.field_columns:
+                columns.update(self.field_columns[name])
+            elif _is_column(model, name):
+                columns.add(name)
+
+            if name in self.expanded:
+                queryset = self.expandable[name].load(queryset, name)
+
+            add = self.field_querysets.get(name)
+            if add is not None and add not in applied:
+                queryset = add(queryset)
+                applied.append(add)
+
+        if self.narrowed:
+            queryset = queryset.only(*columns)
+        return queryset
+
+
+class DynamicFieldsMixin:
+    """Lets the request choose a serializer's fields with ?fields=, ?omit= and ?expand=
+
+    The selection is read from the request in the serializer's context.
+    Serializers built without one send their default fields.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self._context.get('request')
+        self.selection = None if request is None else self.select(request)
+
+    @classmethod
+    def select(cls, request):
+        """The FieldSelection a request makes of this serializer"""
+        return FieldSelection(cls, request.query_params)
+
+    @classmethod
+    def prune(cls, queryset, request, *keep):
+        """FieldSelection.prune() for the selection a request makes
+
+        Call it before serializing, since it also rejects unknown fields.
+        """
+        return cls.select(request).prune(queryset, *keep)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.selection is None:
+            return fields
+
+        for name in self.selection.expanded:
+            fields[name] = self.selection.expandable[name].field()
+        return {name: fields[name] for name in self.selection.names}
+
+
+def _names(query_params, param):
+    value = query_params.get(param, '')
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def _check(param, names, known):
+    unknown = sorted(names.difference(known))
+    if unknown:
+        raise ParseError(f'Unknown field for {param}: {", ".join(unknown)}')
+
+
+def _model_field(model, name):
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+def _is_column(model, name):
+    field = _model_field(model, name)
+    return field is not None and getattr(field, 'concrete', False)
+
+
+def _is_foreign_key(model, name):
+    field = _model_field(model, name)
+    return field is not None and field.concrete and (field.many_to_one or field.one_to_one)
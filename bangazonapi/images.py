@@ -0,0 +1,258 @@
+"""Product image pipeline that runs off the request thread
+
+Products.create only spools the upload and queues it here. A small local
+thread pool then decodes it, validates it with Pillow, writes the original
+and its WebP variants, and points the product at them.
+
+Files are named after the SHA-256 of the uploaded bytes, e.g.
+
+    products/3f/3f0c...e1.png          the upload, as sent
+    products/3f/3f0c...e1.webp         full size WebP
+    products/3f/3f0c...e1-thumb.webp   thumbnail
+
+so the same image uploaded twice is stored once, and a name never refers
+to different content. That lets the files be cached forever.
+
+Images stored before the pipeline made variants have none. Run
+`python manage.py backfill_product_images` to write them.
+
+settings.PRODUCT_IMAGE_WORKERS sets the pool size. 0 processes images on
+the request thread, which the tests use.
+"""
+import base64
+import binascii
+import hashlib
+import io
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from PIL import Image, UnidentifiedImageError
+from bangazonapi.cache import PRODUCT_LIST, bump_versions, product_scope
+from bangazonapi.models import Product
+
+
+logger = logging.getLogger('bangazonapi.images')
+
+UPLOAD_DIRECTORY = 'products'
+
+# Pillow format name to the extension the original is stored with
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+# WebP variant to its name suffix and the box it is scaled down to fit.
+# None keeps the full size.
+VARIANTS = {'full': ('', None), 'thumb': ('-thumb', (320, 320))}
+IMAGE_VARIANTS = {variant: suffix for variant, (suffix, _) in VARIANTS.items()}
+
+WEBP_QUALITY = 80
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class ImageError(ValueError):
+    """The upload is not an image the pipeline accepts"""
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.PRODUCT_IMAGE_WORKERS, thread_name_prefix='product-images')
+        return _executor
+
+
+def spool_upload(value):
+    """Keep an uploaded image around after the request ends
+
+    Arguments:
+        value -- An UploadedFile from a multipart request, or a base64 data
+            URI such as "data:image/png;base64,iVBO..." from a JSON request
+
+    Returns:
+        Something process_product_image() accepts. The base64 text is
+        returned as is, since decoding it is left to the worker.
+    """
+    if isinstance(value, str):
+        return value
+
+    if hasattr(value, 'temporary_file_path'):
+        # Large uploads are already on disk. Link the file so it outlives
+        # the request, which deletes the original when it closes.
+        handle, path = tempfile.mkstemp(prefix='product-image-', dir=settings.FILE_UPLOAD_TEMP_DIR)
+        os.close(handle)
+        os.unlink(path)
+        try:
+            os.link(value.temporary_file_path(), path)
+        except OSError:
+            shutil.copyfile(value.temporary_file_path(), path)
+        return Path(path)
+
+    return value.read()
+
+
+def queue_product_image(product_id, upload):
+    """Process an image for a product, on the pool unless it is disabled
+
+    Arguments:
+        product_id -- Product to attach the image to
+        upload -- Return value of spool_upload()
+    """
+    if settings.PRODUCT_IMAGE_WORKERS == 0:
+        process_product_image(product_id, upload)
+    else:
+        _pool().submit(_process_in_worker, product_id, upload)
+
+
+def _process_in_worker(product_id, upload):
+    close_old_connections()
+    try:
+        process_product_image(product_id, upload)
+    except Exception:
+        logger.exception('image for product %s could not be processed', product_id)
+    finally:
+        close_old_connections()
+
+
+def process_product_image(product_id, upload):
+    """Store an uploaded image and its variants and attach it to a product
+
+    Invalid images are logged and dropped, leaving the product without one.
+
+    Returns:
+        str -- Storage name of the original, or None if it was rejected
+    """
+    try:
+        content = read_upload(upload)
+        name = store_image(content)
+    except ImageError as ex:
+        logger.warning('image for product %s rejected: %s', product_id, ex)
+        return None
+    finally:
+        if isinstance(upload, Path):
+            upload.unlink(missing_ok=True)
+
+    # update() skips the save signals, so invalidate the cache here
+    Product.all_objects.filter(pk=product_id).update(image_path=name)
+    bump_versions(product_scope(product_id), PRODUCT_LIST)
+    return name
+
+
+def read_upload(upload):
+    """Bytes of a spooled upload"""
+    if isinstance(upload, bytes):
+        return upload
+
+    if isinstance(upload, Path):
+        return upload.read_bytes()
+
+    try:
+        _, encoded = upload.split(';base64,', 1)
+        return base64.b64decode(encoded, validate=True)
+    except (ValueError, binascii.Error):
+        raise ImageError('expected a base64 data URI')
+
+
+def store_image(content):
+    """Validate image bytes and write them and their variants
+
+    Returns:
+        str -- Storage name of the original
+    """
+    image = decode_image(content)
+    extension = EXTENSIONS.get(image.format)
+    if extension is None:
+        raise ImageError(f'{image.format} images are not accepted')
+
+    storage = Product._meta.get_field('image_path').storage
+    stem = content_name(content)
+
+    name = f'{stem}.{extension}'
+    if not storage.exists(name):
+        storage.save(name, ContentFile(content))
+
+    write_variants(storage, name, image)
+    return name
+
+
+def backfill_variants(name):
+    """Write the missing WebP variants of a stored original
+
+    Returns:
+        int -- Number of variants written
+
+    Raises:
+        ImageError -- The original is missing or not a readable image
+    """
+    storage = Product._meta.get_field('image_path').storage
+    if not missing_variants(storage, name):
+        return 0
+
+    try:
+        with storage.open(name) as original:
+            content = original.read()
+    except OSError as ex:
+        raise ImageError(f'cannot read {name} ({ex})')
+
+    return write_variants(storage, name, decode_image(content))
+
+
+def decode_image(content):
+    """Validate image bytes and decode them with Pillow"""
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            image.verify()
+        image = Image.open(io.BytesIO(content))
+        image.load()
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError) as ex:
+        raise ImageError(f'not a readable image ({ex})')
+    return image
+
+
+def missing_variants(storage, name):
+    """Suffix to box of the variants of an original not yet in storage"""
+    return {
+        suffix: size for suffix, size in VARIANTS.values()
+        if variant_name(name, suffix) != name and not storage.exists(variant_name(name, suffix))
+    }
+
+
+def write_variants(storage, name, image):
+    """Write the variants of an original that are not yet in storage
+
+    Returns:
+        int -- Number of variants written
+    """
+    missing = missing_variants(storage, name)
+    for suffix, size in missing.items():
+        storage.save(variant_name(name, suffix), ContentFile(webp_bytes(image, size)))
+    return len(missing)
+
+
+def content_name(content):
+    """Storage name, without extension, for image bytes"""
+    digest = hashlib.sha256(content).hexdigest()
+    return f'{UPLOAD_DIRECTORY}/{digest[:2]}/{digest}'
+
+
+def variant_name(name, suffix=''):
+    """Storage name of a WebP variant of a stored original, e.g. '-thumb'"""
+    return f'{os.path.splitext(name)[0]}{suffix}.webp'
+
+
+def webp_bytes(image, size=None):
+    """Encode a Pillow image as WebP, scaled down to fit `size` if given"""
+    variant = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    if size is not None:
+        variant.thumbnail(size)
+
+    output = io.BytesIO()
+    variant.save(output, 'WEBP', quality=WEBP_QUALITY)
+    return output.getvalue()
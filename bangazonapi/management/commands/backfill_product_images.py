@@ -0,0 +1,27 @@
+"""Write the WebP variants of product images stored before the image pipeline"""
+import time
+from django.core.management.base import BaseCommand
+from bangazonapi.images import ImageError, backfill_variants
+from bangazonapi.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Write the missing WebP variants of every product image'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        names = Product.all_objects.exclude(image_path='').exclude(image_path__isnull=True) \
+            .order_by().values_list('image_path', flat=True).distinct()
+
+        written = 0
+        failed = 0
+        for name in names.iterator():
+            try:
+                written += backfill_variants(name)
+            except ImageError as ex:
+                failed += 1
+                self.stderr.write(f'Skipped {name}: {ex}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} image variants, skipped {failed} unreadable images '
+            f'in {time.perf_counter() - started:.1f}s'))
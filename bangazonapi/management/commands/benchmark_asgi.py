@@ -0,0 +1,192 @@
+"""Compare throughput of the WSGI and ASGI applications under concurrent load"""
+import asyncio
+import io
+import json
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+from bangazonapi.models import Customer, Product
+
+
+def summarize(latencies, elapsed, failures):
+    """Throughput plus latency percentiles in milliseconds"""
+    ordered = sorted(latencies)
+    cuts = statistics.quantiles(ordered, n=100, method='inclusive') if len(ordered) > 1 else ordered * 99
+    return {
+        'requests': len(ordered),
+        'failures': failures,
+        'requests_per_second': round(len(ordered) / elapsed, 1),
+        'p50_ms': round(cuts[49] * 1000, 3),
+        'p95_ms': round(cuts[94] * 1000, 3),
+        'p99_ms': round(cuts[98] * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+
+def wsgi_environ(endpoint, token):
+    url = urlsplit(endpoint)
+    return {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'SCRIPT_NAME': '',
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'testserver',
+        'HTTP_AUTHORIZATION': f'Token {token}',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+
+
+def asgi_scope(endpoint, token):
+    url = urlsplit(endpoint)
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': url.path,
+        'raw_path': url.path.encode(),
+        'query_string': url.query.encode(),
+        'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'authorization', f'Token {token}'.encode())],
+        'client': ('127.0.0.1', 50000),
+        'server': ('testserver', 80),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Send concurrent GETs to bangazon.wsgi and bangazon.asgi in process, '
+        'with no server in between, and report JSON throughput and latency'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Timed requests per endpoint')
+        parser.add_argument('--concurrency', type=int, default=32, help='Requests in flight at once')
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            help='Path to benchmark. Repeat to add more. Defaults to the async endpoints.')
+        parser.add_argument('--token', help='Auth token to send. Defaults to the first customer\'s.')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        # Imported here so that only this command pays for building both apps
+        from bangazon.asgi import application as asgi_application
+        from bangazon.wsgi import application as wsgi_application
+
+        token = options['token'] or self.find_token()
+        endpoints = options['endpoints'] or self.default_endpoints()
+
+        report = {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'requests_per_endpoint': options['requests'],
+            'concurrency': options['concurrency'],
+            'wsgi': {},
+            'asgi': {},
+        }
+
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for endpoint in endpoints:
+                report['wsgi'][endpoint] = self.run_wsgi(
+                    wsgi_application, endpoint, token, options['requests'], options['concurrency'])
+                report['asgi'][endpoint] = asyncio.run(self.run_asgi(
+                    asgi_application, endpoint, token, options['requests'], options['concurrency']))
+
+        output = json.dumps(report, indent=4)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as report_file:
+                report_file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    @staticmethod
+    def find_token():
+        customer = Customer.objects.order_by('id').first()
+        token = Token.objects.filter(user_id=customer.user_id).first() if customer else None
+        if token is None:
+            raise CommandError('No customer tokens found. Run generate_catalog or seed the database first.')
+        return token.key
+
+    @staticmethod
+    def default_endpoints():
+        product_id = Product.objects.values_list('id', flat=True).order_by('id').first() or 1
+        return ('/products', f'/products/{product_id}', '/productcategories', '/profile')
+
+    @staticmethod
+    def run_wsgi(application, endpoint, token, requests, concurrency):
+        """Each request runs on one of `concurrency` threads, like a threaded WSGI server"""
+        def timed_get(_):
+            statuses = []
+            started = time.perf_counter()
+            body = application(wsgi_environ(endpoint, token),
+                               lambda status, headers: statuses.append(status))
+            try:
+                b''.join(body)
+            finally:
+                body.close()
+            return time.perf_counter() - started, statuses[0].startswith('200')
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(timed_get, range(concurrency)))  # Warm up every thread
+            started = time.perf_counter()
+            results = list(pool.map(timed_get, range(requests)))
+            elapsed = time.perf_counter() - started
+
+        return summarize([latency for latency, _ in results], elapsed,
+                         sum(1 for _, ok in results if not ok))
+
+    @staticmethod
+    async def run_asgi(application, endpoint, token, requests, concurrency):
+        """`concurrency` tasks on one event loop, like a single ASGI server worker"""
+        async def timed_get():
+            finished = asyncio.Event()
+            sent = []
+
+            async def receive():
+                if not sent:
+                    sent.append(None)
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await finished.wait()
+                return {'type': 'http.disconnect'}
+
+            messages = []
+
+            async def send(message):
+                messages.append(message)
+                if message['type'] == 'http.response.body' and not message.get('more_body'):
+                    finished.set()
+
+            started = time.perf_counter()
+            await application(asgi_scope(endpoint, token), receive, send)
+            finished.set()
+            return time.perf_counter() - started, messages[0].get('status') == 200
+
+        async def client(count, results):
+            for _ in range(count):
+                results.append(await timed_get())
+
+        await asyncio.gather(*[client(1, []) for _ in range(concurrency)])  # Warm up
+
+        results = []
+        per_client, extra = divmod(requests, concurrency)
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            client(per_client + (1 if index < extra else 0), results) for index in range(concurrency)
+        ])
+        elapsed = time.perf_counter() - started
+
+        return summarize([latency for latency, _ in results], elapsed,
+                         sum(1 for _, ok in results if not ok))
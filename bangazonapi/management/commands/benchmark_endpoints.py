@@ -0,0 +1,103 @@
+"""Measure latency and query counts of the hot API endpoints"""
+import json
+import statistics
+import time
+from contextlib import ExitStack
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+from rest_framework.authtoken.models import Token
+from bangazonapi.middleware import QueryStats
+from bangazonapi.models import Order
+
+
+ENDPOINTS = (
+    '/products',
+    '/products?number_sold=5',
+    '/cart',
+    '/orders',
+    '/profile',
+)
+
+
+def summarize(latencies, query_counts):
+    """Percentiles in milliseconds plus the mean number of queries"""
+    ordered = sorted(latencies)
+    cuts = statistics.quantiles(ordered, n=100, method='inclusive') if len(ordered) > 1 else ordered * 99
+    return {
+        'requests': len(ordered),
+        'p50_ms': round(cuts[49] * 1000, 3),
+        'p95_ms': round(cuts[94] * 1000, 3),
+        'p99_ms': round(cuts[98] * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+        'queries_per_request': round(statistics.mean(query_counts), 2),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Drive the hot endpoints through the Django test client and report JSON timings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=10, help='Untimed requests per endpoint')
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            help='Path to benchmark. Repeat to add more. Defaults to the hot endpoints.')
+        parser.add_argument('--token', help='Auth token to send. Defaults to a customer with an open order.')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        token = options['token'] or self.find_token()
+        client = Client(HTTP_AUTHORIZATION=f'Token {token}')
+        endpoints = options['endpoints'] or ENDPOINTS
+
+        report = {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'requests_per_endpoint': options['requests'],
+            'endpoints': {},
+        }
+
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for endpoint in endpoints:
+                for _ in range(options['warmup']):
+                    client.get(endpoint)
+
+                latencies = []
+                query_counts = []
+                for _ in range(options['requests']):
+                    latency, queries, status_code = self.timed_get(client, endpoint)
+                    latencies.append(latency)
+                    query_counts.append(queries)
+
+                report['endpoints'][endpoint] = dict(
+                    summarize(latencies, query_counts), status=status_code)
+
+        output = json.dumps(report, indent=4)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as report_file:
+                report_file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def find_token(self):
+        """Key of a token whose customer has an open order, so /cart has work to do"""
+        open_order = Order.objects.filter(payment_type__isnull=True).select_related('customer').first()
+        tokens = Token.objects.all()
+        if open_order is not None:
+            tokens = tokens.filter(user_id=open_order.customer.user_id)
+
+        token = tokens.first()
+        if token is None:
+            raise CommandError('No auth tokens found. Run generate_catalog or seed the database first.')
+        return token.key
+
+    @staticmethod
+    def timed_get(client, endpoint):
+        stats = QueryStats()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            started = time.perf_counter()
+            response = client.get(endpoint)
+            latency = time.perf_counter() - started
+
+        return latency, stats.count, response.status_code
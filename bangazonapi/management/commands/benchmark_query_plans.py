@@ -0,0 +1,110 @@
+"""Show query plans and timings of the hot lookups with and without their indexes"""
+import json
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from bangazonapi.models import Customer, Order, OrderProduct, Product, ProductRating
+
+
+# Indexes and partial unique constraints declared in model Meta for these lookups
+MODELS = (Order, OrderProduct, Product, ProductRating)
+
+
+def hot_queries():
+    """The lookups made on nearly every request, against ids that exist"""
+    customer = Customer.objects.order_by('id').first()
+    customer_id = customer.id if customer else 1
+    user_id = customer.user_id if customer else 1
+    product_id = Product.objects.values_list('id', flat=True).order_by('id').first() or 1
+    category_id = Product.objects.values_list('category_id', flat=True).order_by('id').first() or 1
+    order_id = Order.objects.values_list('id', flat=True).order_by('id').first() or 1
+
+    return {
+        'customer by user': Customer.objects.filter(user_id=user_id),
+        'open order (cart)': Order.objects.filter(customer_id=customer_id, payment_type__isnull=True),
+        'order history': Order.objects.filter(customer_id=customer_id).order_by('-created_date'),
+        'products in category, newest first':
+            Product.objects.filter(category_id=category_id).order_by('-created_date')[:20],
+        'product cursor page': Product.objects.order_by('-created_date', '-id')[:20],
+        'line items of order for product':
+            OrderProduct.objects.filter(order_id=order_id, product_id=product_id),
+        'ratings of product by customer':
+            ProductRating.objects.filter(product_id=product_id, customer_id=customer_id),
+    }
+
+
+def index_names():
+    """Names of the indexes declared in Meta by the models in MODELS"""
+    names = []
+    for model in MODELS:
+        names.extend(index.name for index in model._meta.indexes)
+        # Conditional unique constraints are created as partial indexes
+        names.extend(
+            constraint.name for constraint in model._meta.constraints
+            if getattr(constraint, 'condition', None) is not None
+        )
+    return names
+
+
+class Command(BaseCommand):
+    help = (
+        'Print EXPLAIN output and timings for the hot lookups, then again with the '
+        'Meta indexes dropped inside a transaction that is rolled back'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200, help='Timed runs per query')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        queries = hot_queries()
+
+        report = {
+            'vendor': connection.vendor,
+            'repeat': self.repeat,
+            'with_indexes': self.measure(queries, 'with indexes'),
+        }
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                for name in index_names():
+                    cursor.execute(f'DROP INDEX IF EXISTS {connection.ops.quote_name(name)}')
+            report['without_indexes'] = self.measure(queries, 'without indexes')
+            transaction.set_rollback(True)
+
+        output = json.dumps(report, indent=4)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as report_file:
+                report_file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def measure(self, queries, phase):
+        """EXPLAIN output and median run time of each query
+
+        The phase is added to the SQL as a comment so that no statement
+        prepared before the indexes were dropped is reused.
+        """
+        results = {}
+        with connection.cursor() as cursor:
+            for label, queryset in queries.items():
+                sql, params = queryset.query.sql_with_params()
+                sql = f'{sql} /* {phase} */'
+
+                cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+                plan = [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+
+                timings = []
+                for _ in range(self.repeat):
+                    started = time.perf_counter()
+                    cursor.execute(sql, params)
+                    cursor.fetchall()
+                    timings.append(time.perf_counter() - started)
+
+                results[label] = {
+                    'plan': plan,
+                    'median_ms': round(statistics.median(timings) * 1000, 3),
+                }
+        return results
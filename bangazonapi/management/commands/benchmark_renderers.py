@@ -0,0 +1,53 @@
+"""Compare payload size and encode and decode time of the response formats"""
+import json
+import statistics
+import time
+import orjson
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from bangazonapi.models import Product
+from bangazonapi.renderers import MessagePackRenderer, ORJSONRenderer, msgpack
+from bangazonapi.views.product import ProductSerializer
+
+
+def median_ms(function, rounds):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return round(statistics.median(timings) * 1000, 3)
+
+
+class Command(BaseCommand):
+    help = 'Render a product list with each renderer and report size and timings as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000, help='Products in the response')
+        parser.add_argument('--rounds', type=int, default=20, help='Timed encodes and decodes per format')
+
+    def handle(self, *args, **options):
+        products = Product.objects.with_aggregates().order_by('id')[:options['products']]
+        data = ProductSerializer(products, many=True).data
+        if not data:
+            raise CommandError('No products to render. Load some with generate_catalog first.')
+
+        formats = {
+            'json': (JSONRenderer(), json.loads),
+            'orjson': (ORJSONRenderer(), orjson.loads),
+        }
+        if msgpack is not None:
+            formats['msgpack'] = (MessagePackRenderer(), lambda payload: msgpack.unpackb(payload, raw=False))
+
+        report = {'products': len(data), 'rounds': options['rounds'], 'formats': {}}
+        for name, (renderer, decode) in formats.items():
+            payload = renderer.render(data)
+            report['formats'][name] = {
+                'bytes': len(payload),
+                'encode_ms': median_ms(lambda: renderer.render(data), options['rounds']),
+                'decode_ms': median_ms(lambda: decode(payload), options['rounds']),
+            }
+        if msgpack is None:
+            report['formats']['msgpack'] = 'not installed'
+
+        self.stdout.write(json.dumps(report, indent=4))
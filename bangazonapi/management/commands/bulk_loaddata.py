@@ -0,0 +1,243 @@
+"""Load fixtures with bulk inserts instead of one save per object"""
+import csv
+import json
+import os
+from itertools import groupby
+from django.apps import apps
+from django.conf import settings
+from django.core import serializers
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+FORMATS = {
+    '.json': 'json',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.csv': 'csv',
+}
+
+
+def iter_json_array(stream, chunk_size=64 * 1024):
+    """Yield the objects of a top-level JSON array without loading the whole file"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    exhausted = False
+
+    while True:
+        # Skip whitespace and separators between array items
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+
+        if not started and position < len(buffer):
+            if buffer[position] != '[':
+                raise CommandError('JSON fixtures must contain a top-level array')
+            started = True
+            position += 1
+            continue
+
+        if started and position < len(buffer) and buffer[position] == ']':
+            return
+
+        try:
+            if position >= len(buffer):
+                raise ValueError('need more data')
+            item, end = decoder.raw_decode(buffer, position)
+        except ValueError:
+            if exhausted:
+                if buffer[position:].strip():
+                    raise CommandError('Fixture ended in the middle of an object')
+                return
+            chunk = stream.read(chunk_size)
+            exhausted = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+
+        yield item
+        position = end
+
+
+def iter_ndjson(stream):
+    """Yield one object per non-blank line"""
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_csv(stream, model_label=None):
+    """Yield fixture records from CSV rows
+
+    Each row needs a `pk` column and one column per field. The model comes
+    from a `model` column, or from `model_label` when there is none.
+    """
+    for row in csv.DictReader(stream):
+        label = row.pop('model', None) or model_label
+        if label is None:
+            raise CommandError('CSV fixtures need a "model" column or the --model option')
+
+        pk = row.pop('pk', None)
+        fields = {name: (None if value == '' else value) for name, value in row.items()}
+        yield {'model': label, 'pk': pk, 'fields': fields}
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream fixtures (JSON, NDJSON or CSV) into the database with bulk_create, '
+        'ordered so foreign keys load before the rows that point at them'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('fixtures', nargs='+', help='Fixture names or paths')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--model', help='app_label.ModelName for CSV files without a model column')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--skip-rebuild', action='store_true',
+                            help='Do not rebuild product aggregates, the search index, similar products and seller sales afterwards')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.model_label = options['model']
+        self.using = options['database']
+        connection = connections[self.using]
+
+        fixtures = [self.find_fixture(label) for label in options['fixtures']]
+        fixtures = self.dependency_order(fixtures)
+
+        loaded_models = set()
+        total = 0
+        with transaction.atomic(using=self.using):
+            with connection.constraint_checks_disabled():
+                for path, model in fixtures:
+                    count = self.load(path)
+                    loaded_models.add(model)
+                    total += count
+                    self.stdout.write(f'  {os.path.basename(path)}: {count}')
+
+            table_names = [model._meta.db_table for model in loaded_models]
+            connection.check_constraints(table_names=table_names)
+
+            sequence_sql = connection.ops.sequence_reset_sql(
+                self.style, list(loaded_models))
+            if sequence_sql:
+                with connection.cursor() as cursor:
+                    for line in sequence_sql:
+                        cursor.execute(line)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Installed {total} object(s) from {len(fixtures)} fixture(s)'))
+
+        if not options['skip_rebuild']:
+            # bulk_create skips the signal handlers, so rebuild what they maintain
+            call_command('rebuild_product_aggregates', stdout=self.stdout)
+            call_command('rebuild_search_index', stdout=self.stdout)
+            call_command('rebuild_similar_products', stdout=self.stdout)
+            call_command('backfill_seller_sales', stdout=self.stdout)
+
+    def find_fixture(self, label):
+        """Resolve a fixture name or path to a file, like loaddata does"""
+        candidates = [label]
+        directories = [app.path for app in apps.get_app_configs()]
+        directories = [os.path.join(path, 'fixtures') for path in directories]
+        directories += [str(path) for path in getattr(settings, 'FIXTURE_DIRS', [])]
+
+        for directory in directories:
+            candidates.append(os.path.join(directory, label))
+            candidates.extend(os.path.join(directory, label + extension) for extension in FORMATS)
+
+        for candidate in candidates:
+            if os.path.isfile(candidate) and os.path.splitext(candidate)[1] in FORMATS:
+                return candidate
+
+        raise CommandError(f'No fixture named "{label}" found')
+
+    def records(self, path):
+        """Stream the raw fixture records from one file"""
+        fixture_format = FORMATS[os.path.splitext(path)[1]]
+        with open(path, encoding='utf-8', newline='') as stream:
+            if fixture_format == 'json':
+                yield from iter_json_array(stream)
+            elif fixture_format == 'ndjson':
+                yield from iter_ndjson(stream)
+            else:
+                yield from iter_csv(stream, self.model_label)
+
+    def dependency_order(self, paths):
+        """Pair each fixture with its model and sort parents before children"""
+        fixtures = []
+        for path in paths:
+            records = self.records(path)
+            first = next(records, None)
+            records.close()
+            if first is None:
+                continue
+            fixtures.append((path, apps.get_model(first['model'])))
+
+        models = {model for _, model in fixtures}
+        depth = {}
+
+        def model_depth(model, visiting=()):
+            if model not in depth:
+                parents = [
+                    field.related_model for field in model._meta.concrete_fields
+                    if field.is_relation and field.related_model in models
+                    and field.related_model is not model and field.related_model not in visiting
+                ]
+                depth[model] = 1 + max(
+                    (model_depth(parent, visiting + (model,)) for parent in parents), default=0)
+            return depth[model]
+
+        # sorted() is stable, so fixtures at the same depth keep their given order
+        return sorted(fixtures, key=lambda fixture: model_depth(fixture[1]))
+
+    def load(self, path):
+        """Insert every object in one fixture file
+
+        Returns:
+            int -- Number of distinct objects written
+        """
+        count = 0
+        objects = serializers.deserialize('python', self.records(path), using=self.using)
+
+        for model, group in groupby(objects, key=lambda deserialized: type(deserialized.object)):
+            batch = []
+            for deserialized in group:
+                batch.append(deserialized)
+                if len(batch) >= self.batch_size:
+                    count += self.insert(model, batch)
+                    batch = []
+            if batch:
+                count += self.insert(model, batch)
+
+        return count
+
+    def insert(self, model, batch):
+        """Upsert one batch, then apply any many-to-many data it carried
+
+        Rows that repeat a primary key replace the earlier row, which is
+        what loaddata does when it saves the same object twice.
+        """
+        latest = {}
+        for deserialized in batch:
+            latest[deserialized.object.pk] = deserialized
+        batch = list(latest.values())
+
+        update_fields = [
+            field.name for field in model._meta.concrete_fields if not field.primary_key
+        ]
+        model._base_manager.using(self.using).bulk_create(
+            [deserialized.object for deserialized in batch],
+            update_conflicts=True,
+            unique_fields=[model._meta.pk.name],
+            update_fields=update_fields,
+        )
+
+        for deserialized in batch:
+            for accessor, values in (deserialized.m2m_data or {}).items():
+                if values:
+                    getattr(deserialized.object, accessor).set(values)
+
+        return len(batch)
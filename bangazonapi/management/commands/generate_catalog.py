@@ -0,0 +1,172 @@
+"""Generate a large synthetic catalog for load testing"""
+import datetime
+import random
+import secrets
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+from bangazonapi.models import Customer, Order, OrderProduct, Payment
+from bangazonapi.models import Product, ProductCategory, ProductRating
+
+
+SCALES = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+}
+
+# Every generated user can log in with this password
+PASSWORD = 'Admin8*'
+
+CATEGORIES = ('Tools', 'Auto', 'Technology', 'Games/Toys', 'Music', 'Sporting Goods')
+WORDS = ('Kite', 'Golf', 'Saab', 'Lamp', 'Desk', 'Chair', 'Phone', 'Guitar', 'Drill',
+         'Glove', 'Ball', 'Bike', 'Camera', 'Watch', 'Boots', 'Radio', 'Blender', 'Tent')
+CITIES = ('Pittsburgh', 'Nashville', 'Seoul', 'Vratsa', 'Lima', 'Oslo', 'Austin', 'Kyoto')
+
+
+class Command(BaseCommand):
+    help = 'Bulk insert synthetic customers, products, orders and ratings for benchmarking'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', choices=sorted(SCALES), default='10k',
+            help='Number of products to generate. Other row counts are derived from it.')
+        parser.add_argument('--products', type=int, help='Override the number of products')
+        parser.add_argument('--customers', type=int, help='Defaults to products / 10')
+        parser.add_argument('--orders', type=int, help='Defaults to products / 2')
+        parser.add_argument('--lines-per-order', type=int, default=3)
+        parser.add_argument('--ratings', type=int, help='Defaults to products')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for repeatable data')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+
+        products = options['products'] or SCALES[options['scale']]
+        customers = options['customers'] or max(products // 10, 1)
+        orders = options['orders'] or max(products // 2, 1)
+        ratings = options['ratings'] if options['ratings'] is not None else products
+
+        with transaction.atomic():
+            customer_ids = self.create_customers(customers)
+            category_ids = self.create_categories()
+            product_ids = self.create_products(products, customer_ids, category_ids)
+            payment_ids = self.create_payments(customer_ids)
+            order_ids = self.create_orders(orders, customer_ids, payment_ids)
+            self.create_line_items(order_ids, product_ids, options['lines_per_order'])
+            self.create_ratings(ratings, product_ids, customer_ids)
+
+        # bulk_create skips the signal handlers, so rebuild what they maintain
+        call_command('rebuild_product_aggregates', stdout=self.stdout)
+        call_command('rebuild_search_index', stdout=self.stdout)
+        call_command('rebuild_similar_products', stdout=self.stdout)
+        call_command('backfill_seller_sales', stdout=self.stdout)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {customers} customers, {products} products and {orders} orders'))
+
+    def insert(self, model, rows):
+        """bulk_create `rows` in batches and return the new primary keys"""
+        ids = []
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                ids.extend(obj.pk for obj in model.objects.bulk_create(batch))
+                batch = []
+        if batch:
+            ids.extend(obj.pk for obj in model.objects.bulk_create(batch))
+
+        self.stdout.write(f'  {model._meta.verbose_name_plural}: {len(ids)}')
+        return ids
+
+    def create_customers(self, count):
+        password = make_password(PASSWORD)
+        prefix = secrets.token_hex(3)
+        user_ids = self.insert(User, (
+            User(username=f'bench-{prefix}-{index}', password=password,
+                 first_name='Bench', last_name=f'Customer {index}',
+                 email=f'bench-{prefix}-{index}@example.com')
+            for index in range(count)
+        ))
+
+        self.insert(Token, (
+            Token(key=secrets.token_hex(20), user_id=user_id) for user_id in user_ids
+        ))
+
+        return self.insert(Customer, (
+            Customer(user_id=user_id, phone_number='555-1212',
+                     address=f'{index} Benchmark Way')
+            for index, user_id in enumerate(user_ids)
+        ))
+
+    def create_categories(self):
+        existing = list(ProductCategory.objects.values_list('id', flat=True))
+        if existing:
+            return existing
+
+        return self.insert(ProductCategory, (
+            ProductCategory(name=name) for name in CATEGORIES
+        ))
+
+    def create_products(self, count, customer_ids, category_ids):
+        rand = self.random
+        return self.insert(Product, (
+            Product(
+                name=f'{rand.choice(WORDS)} {index}',
+                customer_id=rand.choice(customer_ids),
+                price=round(rand.uniform(1, 2000), 2),
+                description=' '.join(rand.choices(WORDS, k=12)).lower(),
+                quantity=rand.randint(0, 500),
+                category_id=rand.choice(category_ids),
+                location=rand.choice(CITIES),
+            )
+            for index in range(count)
+        ))
+
+    def create_payments(self, customer_ids):
+        today = datetime.date.today()
+        return self.insert(Payment, (
+            Payment(merchant_name='Visa', account_number=f'4111-{customer_id:08d}',
+                    customer_id=customer_id, create_date=today,
+                    expiration_date=today + datetime.timedelta(days=3 * 365))
+            for customer_id in customer_ids
+        ))
+
+    def create_orders(self, count, customer_ids, payment_ids):
+        rand = self.random
+        today = datetime.date.today()
+
+        def build(index):
+            # Orders go to customers round robin. The first order of every
+            # third customer stays open so carts exist, one per customer at most.
+            position = index % len(customer_ids)
+            is_open = index < len(customer_ids) and position % 3 == 0
+            return Order(
+                customer_id=customer_ids[position],
+                payment_type_id=None if is_open else payment_ids[position],
+                created_date=today - datetime.timedelta(days=rand.randint(0, 3 * 365)),
+            )
+
+        return self.insert(Order, (build(index) for index in range(count)))
+
+    def create_line_items(self, order_ids, product_ids, lines_per_order):
+        rand = self.random
+        return self.insert(OrderProduct, (
+            OrderProduct(order_id=order_id, product_id=rand.choice(product_ids))
+            for order_id in order_ids
+            for _ in range(rand.randint(1, lines_per_order * 2 - 1))
+        ))
+
+    def create_ratings(self, count, product_ids, customer_ids):
+        rand = self.random
+        return self.insert(ProductRating, (
+            ProductRating(product_id=rand.choice(product_ids),
+                          customer_id=rand.choice(customer_ids),
+                          rating=rand.randint(1, 5))
+            for _ in range(count)
+        ))
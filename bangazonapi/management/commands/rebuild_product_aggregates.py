@@ -0,0 +1,33 @@
+"""Recompute the denormalized sales and rating aggregates on products"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from bangazonapi.cache import PRODUCT_LIST, PRODUCTS, bump_versions
+from bangazonapi.models import OrderProduct, Product, ProductRating
+
+
+class Command(BaseCommand):
+    help = 'Rebuild Product.sold_count, rating_sum and rating_count from scratch'
+
+    def handle(self, *args, **options):
+        sold = OrderProduct.objects.filter(
+            product=OuterRef('pk'), order__payment_type__isnull=False
+        ).order_by().values('product').annotate(total=Count('id')).values('total')
+
+        ratings = ProductRating.objects.filter(
+            product=OuterRef('pk')
+        ).order_by().values('product')
+
+        with transaction.atomic():
+            updated = Product.all_objects.update(
+                sold_count=Coalesce(Subquery(sold), 0),
+                rating_sum=Coalesce(Subquery(
+                    ratings.annotate(total=Sum('rating')).values('total')), 0),
+                rating_count=Coalesce(Subquery(
+                    ratings.annotate(total=Count('id')).values('total')), 0),
+            )
+            bump_versions(PRODUCTS, PRODUCT_LIST)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt aggregates for {updated} products'))
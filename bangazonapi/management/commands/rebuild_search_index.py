@@ -0,0 +1,14 @@
+"""Re-index every visible product for full-text search"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from bangazonapi.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text product search index from the product table'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            indexed = rebuild_search_index()
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} products'))
@@ -0,0 +1,20 @@
+"""Recount co-purchases and the similar products of every product"""
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from bangazonapi.cache import PRODUCTS, bump_versions
+from bangazonapi.similar import rebuild_similar_products
+
+
+class Command(BaseCommand):
+    help = 'Rebuild CoPurchase and SimilarProducts from the paid orders'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            pairs, lists = rebuild_similar_products()
+            bump_versions(PRODUCTS)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Counted {pairs} product pairs and wrote {lists} similar product lists '
+            f'in {time.perf_counter() - started:.1f}s'))
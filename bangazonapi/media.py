@@ -0,0 +1,160 @@
+"""Serve uploaded media with caching headers, byte ranges and sendfile
+
+django.views.static.serve reads whole files through Python, ignores Range
+headers and sends no cache lifetime. serve_media() replaces it.
+
+With settings.MEDIA_SENDFILE set, the view only checks the path and sets
+the headers. The file itself is sent by the web server in front of Django:
+
+    'x-sendfile'        Apache mod_xsendfile, lighttpd. The header holds
+                        the absolute path of the file.
+    'x-accel-redirect'  nginx. The header holds the path under
+                        settings.MEDIA_ACCEL_REDIRECT_PREFIX, which nginx
+                        maps to MEDIA_ROOT with an `internal` location.
+
+Without it, Django sends the file from a memory map, one range at most.
+
+Names that contain a SHA-256, like the product images written by
+bangazonapi/images.py, never change content, so they are cached for a year
+as immutable. Other files are cached for settings.MEDIA_MAX_AGE seconds.
+"""
+import mimetypes
+import mmap
+import os
+import posixpath
+import re
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+
+IMMUTABLE_NAME = re.compile(r'(^|/)[0-9a-f]{64}[^/]*$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_CHUNK_SIZE = 256 * 1024
+
+
+def cache_control(path):
+    if IMMUTABLE_NAME.search(path):
+        return f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return f'public, max-age={getattr(settings, "MEDIA_MAX_AGE", 3600)}'
+
+
+def file_etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def not_modified(request, etag, mtime):
+    """Whether the client's copy, per If-None-Match or If-Modified-Since, is current"""
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        etags = parse_etags(if_none_match)
+        return '*' in etags or etag in etags or f'W/{etag}' in etags
+
+    modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return modified_since is not None and int(mtime) <= modified_since
+
+
+def requested_range(request, size, etag, mtime):
+    """The (start, end) byte range to send, both inclusive
+
+    Returns:
+        None to send the whole file, or False if the range cannot be satisfied
+    """
+    header = request.META.get('HTTP_RANGE')
+    if header is None:
+        return None
+
+    # A range only applies to the version of the file the client has part of
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range is not None and if_range != etag and parse_http_date_safe(if_range) != int(mtime):
+        return None
+
+    # Several ranges would need a multipart body. Sending it all is allowed.
+    match = RANGE.match(header.strip())
+    if match is None:
+        return None
+
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    elif last:
+        start = max(size - int(last), 0)
+        end = size - 1
+    else:
+        return None
+
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def mapped_chunks(path, start, end):
+    """Yield bytes start..end (inclusive) of a file from a read-only memory map"""
+    with open(path, 'rb') as media_file:
+        with mmap.mmap(media_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for offset in range(start, end + 1, STREAM_CHUNK_SIZE):
+                yield mapped[offset:min(offset + STREAM_CHUNK_SIZE, end + 1)]
+
+
+@require_safe
+def serve_media(request, path):
+    """Send a file from MEDIA_ROOT, or hand it to the web server to send"""
+    path = posixpath.normpath(path).lstrip('/')
+    # Raises SuspiciousFileOperation, a 400, for paths outside MEDIA_ROOT
+    full_path = safe_join(os.path.abspath(settings.MEDIA_ROOT), path)
+    try:
+        stat = os.stat(full_path)
+    except (OSError, ValueError):
+        raise Http404('Media file not found')
+    if not os.path.isfile(full_path):
+        raise Http404('Media file not found')
+
+    etag = file_etag(stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': cache_control(path),
+        'Accept-Ranges': 'bytes',
+    }
+
+    if not_modified(request, etag, stat.st_mtime):
+        return HttpResponseNotModified(headers=headers)
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    if encoding:
+        headers['Content-Encoding'] = encoding
+
+    sendfile = getattr(settings, 'MEDIA_SENDFILE', None)
+    if sendfile == 'x-sendfile':
+        headers['X-Sendfile'] = full_path
+        return HttpResponse(content_type=content_type, headers=headers)
+    if sendfile == 'x-accel-redirect':
+        prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+        headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + path
+        return HttpResponse(content_type=content_type, headers=headers)
+
+    size = stat.st_size
+    byte_range = requested_range(request, size, etag, stat.st_mtime)
+    if byte_range is False:
+        headers['Content-Range'] = f'bytes */{size}'
+        return HttpResponse(status=416, headers=headers)
+
+    if size == 0:
+        return HttpResponse(b'', content_type=content_type, headers=headers)
+
+    start, end = byte_range or (0, size - 1)
+    headers['Content-Length'] = str(end - start + 1)
+    response = StreamingHttpResponse(
+        mapped_chunks(full_path, start, end), content_type=content_type, headers=headers)
+
+    if byte_range:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    return response
@@ -0,0 +1,204 @@
+"""Middleware for the Bangazon API"""
+import hashlib
+import logging
+import time
+from contextlib import ExitStack
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from bangazonapi.cache import CACHE_ALIAS
+from bangazonapi.compression import acompress_stream, compress, compress_stream, compressible, negotiate
+
+
+logger = logging.getLogger('bangazonapi.requests')
+
+
+class QueryStats:
+    """Database execute wrapper that counts queries and sums their time"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+class RequestInstrumentationMiddleware:
+    """Reports query count, SQL time, view time and response size per request
+
+    Enabled with settings.REQUEST_INSTRUMENTATION. The numbers go out as a
+    Server-Timing header and as one log line on the `bangazonapi.requests`
+    logger. Requests running more than settings.REQUEST_QUERY_THRESHOLD
+    queries are logged as warnings.
+
+    Server-Timing metrics:
+        db -- Time spent in SQL, with the query count as its description
+        app -- Time spent in the view outside SQL, mostly serialization
+        render -- Time spent rendering the response body
+        total -- Wall time for the whole request
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        request._instrumentation = {'stats': stats}
+        started = time.perf_counter()
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+
+        total = time.perf_counter() - started
+        timings = request._instrumentation
+        view = timings.get('view_end', started + total) - timings.get('view_start', started)
+        view_queries = timings.get('view_db', stats.seconds)
+        render = timings.get('render_end', 0) - timings.get('render_start', 0)
+        size = 0 if response.streaming else len(response.content)
+
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={stats.seconds * 1000:.1f};desc="{stats.count} queries"',
+            f'app;dur={max(view - view_queries, 0) * 1000:.1f}',
+            f'render;dur={render * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ))
+
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': stats.count,
+            'sql_ms': round(stats.seconds * 1000, 1),
+            'app_ms': round(max(view - view_queries, 0) * 1000, 1),
+            'render_ms': round(render * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+            'bytes': size,
+        }
+        message = ' '.join(f'{key}={value}' for key, value in fields.items())
+
+        threshold = getattr(settings, 'REQUEST_QUERY_THRESHOLD', None)
+        if threshold is not None and stats.count > threshold:
+            logger.warning('query threshold exceeded %s', message, extra={'request_stats': fields})
+        else:
+            logger.info(message, extra={'request_stats': fields})
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = request._instrumentation
+        timings['view_start'] = time.perf_counter()
+        timings['view_db_start'] = timings['stats'].seconds
+
+    def process_template_response(self, request, response):
+        timings = request._instrumentation
+        timings['view_end'] = timings['render_start'] = time.perf_counter()
+        timings['view_db'] = timings['stats'].seconds - timings.get('view_db_start', 0)
+
+        def finish_render(rendered):
+            timings['render_end'] = time.perf_counter()
+
+        response.add_post_render_callback(finish_render)
+        return response
+
+
+class CompressionMiddleware:
+    """Compresses response bodies with brotli or gzip, as the client accepts
+
+    Bodies under settings.COMPRESSION_MIN_SIZE bytes, types that are
+    already compressed and partial content are sent as is. Streaming
+    responses are compressed chunk by chunk as they are sent.
+
+    A compressed body is cached in the response cache under the response's
+    ETag and the encoding. The ETag changes whenever the data behind the
+    response does (see bangazonapi/conditional.py), so a hot response is
+    compressed once per version and encoding.
+
+    Like django.middleware.gzip.GZipMiddleware, a strong ETag is made weak,
+    since the compressed bytes differ from the ones it was computed for.
+
+    It works in both sync and async chains, so under ASGI the async views
+    are not sent through a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding') or response.status_code == 206:
+            return response
+        if not compressible(response.get('Content-Type', '')):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+
+        if response.streaming:
+            length = response.get('Content-Length')
+            if length is not None and int(length) < min_size:
+                return response
+            if response.is_async:
+                response.streaming_content = acompress_stream(response.streaming_content, encoding)
+            else:
+                response.streaming_content = compress_stream(response.streaming_content, encoding)
+            del response['Content-Length']
+        else:
+            if len(response.content) < min_size:
+                return response
+            compressed = self.compressed_content(request, response, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
+
+    def compressed_content(self, request, response, encoding):
+        """The body compressed, from the cache when the response has an ETag"""
+        etag = response.get('ETag')
+        if not etag:
+            return compress(response.content, encoding)
+
+        digest = hashlib.sha1(f'{request.path}\n{etag}'.encode('utf-8')).hexdigest()
+        key = f'compressed:{encoding}:{digest}'
+        cache = caches[CACHE_ALIAS]
+        compressed = cache.get(key)
+        if compressed is None:
+            compressed = compress(response.content, encoding)
+            cache.set(key, compressed)
+        return compressed
@@ -8,3 +8,6 @@ from .recommendation import Recommendation
 from .rating import Rating
 from .favorite import Favorite
 from .productrating import ProductRating
+from .copurchase import CoPurchase, SimilarProducts
+from .sellersales import SellerSalesDaily
+from .productsearch import ProductSearch
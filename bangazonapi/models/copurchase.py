@@ -0,0 +1,35 @@
+"""Co-purchase counts behind "customers who bought this also bought" """
+from django.db import models
+
+
+class CoPurchase(models.Model):
+    """Number of paid orders that contain both `product` and `other`
+
+    Each pair is stored in both directions. Maintained by the order_paid
+    handler in bangazonapi/signals.py, see bangazonapi/similar.py.
+    """
+
+    product = models.ForeignKey("Product", on_delete=models.CASCADE, related_name="+")
+    other = models.ForeignKey("Product", on_delete=models.CASCADE, related_name="+")
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'other'], name='copurchase_product_other_uniq'),
+        ]
+        indexes = [
+            # Top neighbors of a product
+            models.Index(fields=['product', '-orders', 'other'], name='copurchase_product_orders_idx'),
+        ]
+
+
+class SimilarProducts(models.Model):
+    """The top co-purchased products of one product, best first
+
+    One row per product, so a lookup is a single primary key read.
+    """
+
+    product = models.OneToOneField(
+        "Product", on_delete=models.CASCADE, primary_key=True, related_name="+")
+    # Product ids, most often bought together first
+    neighbors = models.JSONField(default=list)
@@ -8,3 +8,19 @@ class Order(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.DO_NOTHING,)
     payment_type = models.ForeignKey(Payment, on_delete=models.DO_NOTHING, null=True)
     created_date = models.DateField(default="0000-00-00",)
+
+    class Meta:
+        indexes = [
+            # Open order (cart) and orders paid with a given payment type
+            models.Index(fields=['customer', 'payment_type'], name='order_customer_payment_idx'),
+            # Order history, newest first
+            models.Index(fields=['customer', 'created_date'], name='order_customer_created_idx'),
+        ]
+        constraints = [
+            # An order with no payment type is the customer's cart
+            models.UniqueConstraint(
+                fields=['customer'],
+                condition=models.Q(payment_type__isnull=True),
+                name='order_one_open_per_customer',
+            ),
+        ]
@@ -10,3 +10,8 @@ class OrderProduct(models.Model):
     product = models.ForeignKey("Product",
                                 on_delete=models.DO_NOTHING,
                                 related_name="lineitems")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order', 'product'], name='orderproduct_order_product_idx'),
+        ]
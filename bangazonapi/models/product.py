@@ -1,16 +1,46 @@
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import Case, F, FloatField, Value, When
+from safedelete.managers import SafeDeleteManager
 from safedelete.models import SafeDeleteModel
 from safedelete.models import SOFT_DELETE
+from safedelete.queryset import SafeDeleteQueryset
 from .customer import Customer
 from .productcategory import ProductCategory
-from .orderproduct import OrderProduct
-from .productrating import ProductRating
+
+
+class ProductQuerySet(SafeDeleteQueryset):
+    """Queryset with database-side versions of the product calculated fields"""
+
+    def with_aggregates(self, *names):
+        """Annotate number_sold and average_rating so they can be filtered and sorted in SQL
+
+        Arguments:
+            names -- Aggregates to annotate, by default both. Ones the
+                queryset already has are skipped.
+
+        Returns:
+            ProductQuerySet -- Products annotated with the aggregates
+        """
+        aggregates = {
+            'number_sold': lambda: F('sold_count'),
+            'average_rating': lambda: Case(
+                When(rating_count=0, then=Value(0.0)),
+                default=F('rating_sum') * 1.0 / F('rating_count'),
+                output_field=FloatField(),
+            ),
+        }
+        return self.annotate(**{
+            name: aggregates[name]()
+            for name in names or aggregates
+            if name not in self.query.annotations
+        })
 
 
 class Product(SafeDeleteModel):
 
     _safedelete_policy = SOFT_DELETE
+    objects = SafeDeleteManager.from_queryset(ProductQuerySet)()
     name = models.CharField(max_length=50,)
     customer = models.ForeignKey(
         Customer, on_delete=models.DO_NOTHING, related_name='products')
@@ -26,6 +56,13 @@ class Product(SafeDeleteModel):
         upload_to='products', height_field=None,
         width_field=None, max_length=None, null=True)
 
+    # Denormalized aggregates maintained by the handlers in
+    # bangazonapi/signals.py. Rebuild them from scratch with
+    # `python manage.py rebuild_product_aggregates`.
+    sold_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+
     @property
     def number_sold(self):
         """number_sold property of a product
@@ -33,9 +70,14 @@ class Product(SafeDeleteModel):
         Returns:
             int -- Number items on completed orders
         """
-        sold = OrderProduct.objects.filter(
-            product=self, order__payment_type__isnull=False)
-        return sold.count()
+        try:
+            return self.__number_sold
+        except AttributeError:
+            return self.sold_count
+
+    @number_sold.setter
+    def number_sold(self, value):
+        self.__number_sold = value
 
     @property
     def can_be_rated(self):
@@ -57,14 +99,28 @@ class Product(SafeDeleteModel):
         Returns:
             number -- The average rating for the product
         """
-        ratings = ProductRating.objects.filter(product=self)
-        total_rating = 0
-        for rating in ratings:
-            total_rating += rating.rating
+        try:
+            return self.__average_rating
+        except AttributeError:
+            pass
+
+        if self.rating_count == 0:
+            return 0
+
+        return self.rating_sum / self.rating_count
 
-        avg = total_rating / len(ratings)
-        return avg
+    @average_rating.setter
+    def average_rating(self, value):
+        self.__average_rating = value
 
     class Meta:
         verbose_name = ("product")
         verbose_name_plural = ("products")
+        indexes = [
+            # Category filter, newest first, over products that are not deleted
+            models.Index(fields=['category', 'created_date'], name='product_category_created_idx',
+                         condition=models.Q(deleted__isnull=True)),
+            # Keyset pagination in CreatedDateCursorPagination. The default
+            # manager filters on deleted IS NULL, so it leads the index.
+            models.Index(fields=['deleted', 'created_date', 'id'], name='product_deleted_created_idx'),
+        ]
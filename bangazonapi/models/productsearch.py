@@ -0,0 +1,42 @@
+"""Read-only model over the FTS5 product search index"""
+from django.db import models
+from django.db.models import Lookup
+
+
+class Match(Lookup):
+    """FTS5 full-text match, `column MATCH query`"""
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class SearchDocumentField(models.TextField):
+    """The FTS5 hidden column named after its table, which matches every column"""
+
+
+SearchDocumentField.register_lookup(Match)
+
+
+class ProductSearch(models.Model):
+    """One row of the FTS5 table built by bangazonapi/search.py
+
+    Lets product queries join the index with the ORM, e.g.
+
+        Product.objects.filter(search__document__match='"kite"*').order_by('search__rank')
+
+    The table is created by search.create_search_index(), not by migrate.
+    """
+
+    # FTS5 keys its rows by rowid, which holds the product id
+    product = models.OneToOneField(
+        "Product", on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid', related_name='search')
+    document = SearchDocumentField(db_column='bangazonapi_product_search')
+    # bm25 rank of the current match, lower is better
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'bangazonapi_product_search'
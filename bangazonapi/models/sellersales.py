@@ -0,0 +1,27 @@
+"""Daily sales rollup per seller and product"""
+from django.db import models
+from .customer import Customer
+
+
+class SellerSalesDaily(models.Model):
+    """Units and revenue of one seller's product on paid orders of one day
+
+    The day is the order's created_date and revenue is at the product's
+    price when the order was paid. Maintained by the order_paid handler in
+    bangazonapi/signals.py, see bangazonapi/sales.py.
+    """
+
+    seller = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name="sales")
+    product = models.ForeignKey("Product", on_delete=models.CASCADE, related_name="+")
+    day = models.DateField()
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['seller', 'product', 'day'], name='sellersales_seller_product_day_uniq'),
+        ]
+        indexes = [
+            # Sales dashboard: a seller's days in a range
+            models.Index(fields=['seller', 'day'], name='sellersales_seller_day_idx'),
+        ]
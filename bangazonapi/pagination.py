@@ -0,0 +1,226 @@
+"""Pagination styles for the Bangazon API list endpoints"""
+import base64
+import binascii
+import datetime
+from collections import OrderedDict
+from urllib import parse
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class BoundedLimitOffsetPagination(LimitOffsetPagination):
+    """Limit/offset pagination that caps ?limit= at settings.MAX_PAGE_SIZE"""
+    max_limit = settings.MAX_PAGE_SIZE
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for async views, using the async ORM"""
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        self.count = await queryset.acount()
+        self.offset = self.get_offset(request)
+        if self.count > self.limit and self.template is not None:
+            self.display_page_controls = True
+
+        if self.count == 0 or self.offset > self.count:
+            return []
+        return [row async for row in queryset[self.offset:self.offset + self.limit]]
+
+
+class CreatedDateCursorPagination(BasePagination):
+    """Keyset pagination over (created_date, id), newest first
+
+    Each cursor encodes the (created_date, id) of the row it continues from,
+    so the database seeks straight to the page with an indexed range
+    condition instead of counting past `offset` rows.
+
+    Request the first page with an empty cursor (`?cursor=`) and follow the
+    `next` and `previous` links from there.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = settings.MAX_PAGE_SIZE
+    ordering = ('created_date', 'id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset, position, reverse = self.page_queryset(queryset, request)
+        return self.set_page(list(queryset), position, reverse)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for async views, using the async ORM"""
+        queryset, position, reverse = self.page_queryset(queryset, request)
+        return self.set_page([row async for row in queryset], position, reverse)
+
+    def page_queryset(self, queryset, request):
+        """Narrow `queryset` to the rows of the requested page, plus one
+
+        Returns:
+            tuple -- (queryset, cursor position, reverse)
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+        date_field, id_field = self.ordering
+
+        if position is not None:
+            created_date, pk = position
+            if reverse:
+                queryset = queryset.filter(
+                    Q(**{f'{date_field}__gt': created_date}) |
+                    Q(**{date_field: created_date, f'{id_field}__gt': pk}))
+            else:
+                queryset = queryset.filter(
+                    Q(**{f'{date_field}__lt': created_date}) |
+                    Q(**{date_field: created_date, f'{id_field}__lt': pk}))
+
+        if reverse:
+            queryset = queryset.order_by(date_field, id_field)
+        else:
+            queryset = queryset.order_by(f'-{date_field}', f'-{id_field}')
+
+        # Fetch one extra row to learn whether there is another page
+        return queryset[:self.page_size + 1], position, reverse
+
+    def set_page(self, results, position, reverse):
+        """Trim the extra row and remember which links the page has"""
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def decode_cursor(self, request):
+        """Read the (created_date, id) position and direction from the request
+
+        Returns:
+            tuple -- ((created_date, id) or None, reverse)
+        """
+        encoded = request.query_params.get(self.cursor_query_param, '')
+        if not encoded:
+            return None, False
+
+        try:
+            querystring = base64.b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring)
+            position = (datetime.date.fromisoformat(tokens['d'][0]), int(tokens['i'][0]))
+            reverse = bool(int(tokens.get('r', ['0'])[0]))
+        except (TypeError, ValueError, KeyError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+        return position, reverse
+
+    def encode_cursor(self, row, reverse):
+        """Build the URL that continues paging from `row`"""
+        date_field, id_field = self.ordering
+        tokens = {
+            'd': str(getattr(row, date_field)),
+            'i': getattr(row, id_field),
+        }
+        if reverse:
+            tokens['r'] = '1'
+
+        querystring = parse.urlencode(tokens, doseq=True)
+        encoded = base64.b64encode(querystring.encode('ascii')).decode('ascii')
+        url = remove_query_param(self.base_url, 'offset')
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+
+class PaginatedViewSetMixin:
+    """Gives a plain ViewSet the paginator hooks that GenericViewSet provides
+
+    Limit/offset pagination is used by default. Set `cursor_pagination_class`
+    to let clients switch to keyset pagination by sending `?cursor=`.
+    """
+    pagination_class = api_settings.DEFAULT_PAGINATION_CLASS
+    cursor_pagination_class = None
+
+    @property
+    def paginator(self):
+        """The paginator instance for this request, or None"""
+        if not hasattr(self, '_paginator'):
+            if (self.cursor_pagination_class is not None and
+                    self.cursor_pagination_class.cursor_query_param in self.request.query_params):
+                self._paginator = self.cursor_pagination_class()
+            elif self.pagination_class is None:
+                self._paginator = None
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def paginated_response(self, queryset, serializer_class):
+        """Serialize one page of `queryset` and wrap it with paging links
+
+        Returns:
+            Response -- JSON serialized page of instances
+        """
+        if self.paginator is None:
+            serializer = serializer_class(
+                queryset, many=True, context={'request': self.request})
+            return Response(serializer.data)
+
+        page = self.paginator.paginate_queryset(queryset, self.request, view=self)
+        serializer = serializer_class(
+            page, many=True, context={'request': self.request})
+        return self.paginator.get_paginated_response(serializer.data)
+
+    async def apaginated_response(self, queryset, serializer_class):
+        """paginated_response() for async views, using the async ORM
+
+        The serializer must not follow relations that were not loaded with
+        select_related, since it runs in the event loop.
+        """
+        if self.paginator is None:
+            rows = [row async for row in queryset]
+            serializer = serializer_class(
+                rows, many=True, context={'request': self.request})
+            return Response(serializer.data)
+
+        page = await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+        serializer = serializer_class(
+            page, many=True, context={'request': self.request})
+        return self.paginator.get_paginated_response(serializer.data)
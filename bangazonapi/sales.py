@@ -0,0 +1,123 @@
+"""Seller sales rollups behind GET /profile/sales
+
+SellerSalesDaily holds units and revenue per seller, product and day, so a
+dashboard reads at most one row per product and day instead of scanning
+every line item. The order_paid handler in bangazonapi/signals.py adds
+each newly paid order with record_order_sales(). Rebuild the rollups from
+the order history with `python manage.py backfill_seller_sales`.
+
+As with sold_count, line items added to or removed from orders that are
+already paid are only picked up by a backfill.
+"""
+from django.db import connections
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from bangazonapi.cache import SALES, bump_versions, sales_scope
+from bangazonapi.models import OrderProduct, Product, SellerSalesDaily
+
+
+# Query param value to the expression that gives a rollup day's period
+GRANULARITIES = {
+    'day': lambda: F('day'),
+    'week': lambda: TruncWeek('day'),
+    'month': lambda: TruncMonth('day'),
+}
+
+BACKFILL_CHUNK_SIZE = 5000
+
+
+def sales_rows(line_items):
+    """Units and revenue of line items per seller, product and day
+
+    Arguments:
+        line_items -- OrderProduct queryset of paid orders
+    """
+    return (
+        line_items.order_by()
+        .values('product', seller=F('product__customer'), day=F('order__created_date'))
+        .annotate(units=Count('id'), revenue=Sum('product__price'))
+    )
+
+
+def record_order_sales(order):
+    """Add a newly paid order to its sellers' rollups"""
+    rows = {
+        (row['seller'], row['product'], row['day']): row
+        for row in sales_rows(OrderProduct.objects.filter(order=order))
+    }
+    if not rows:
+        return
+    sellers = {seller for seller, _, _ in rows}
+
+    existing = SellerSalesDaily.objects.filter(
+        seller__in=sellers,
+        product__in={product for _, product, _ in rows},
+        day__in={day for _, _, day in rows},
+    ).values_list('seller', 'product', 'day', 'id')
+
+    for seller, product, day, rollup_id in existing:
+        row = rows.pop((seller, product, day), None)
+        if row is not None:
+            SellerSalesDaily.objects.filter(pk=rollup_id).update(
+                units=F('units') + row['units'], revenue=F('revenue') + row['revenue'])
+
+    SellerSalesDaily.objects.bulk_create(_rollup(row) for row in rows.values())
+
+    bump_versions(*[sales_scope(seller) for seller in sellers])
+
+
+def backfill_sales(chunk_size=BACKFILL_CHUNK_SIZE):
+    """Rebuild every rollup from the paid orders, a range of product ids at a time
+
+    A product's rows all come from one chunk, so each chunk is a plain
+    insert. Run it inside a transaction.
+
+    Returns:
+        int -- Number of rollup rows written
+    """
+    with connections[SellerSalesDaily.objects.db].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SellerSalesDaily._meta.db_table}")
+
+    paid = OrderProduct.objects.filter(order__payment_type__isnull=False)
+    last_id = Product.all_objects.aggregate(last_id=Max('id'))['last_id'] or 0
+    written = 0
+
+    for first_id in range(0, last_id, chunk_size):
+        rows = sales_rows(paid.filter(product_id__gt=first_id, product_id__lte=first_id + chunk_size))
+        written += len(SellerSalesDaily.objects.bulk_create(
+            (_rollup(row) for row in rows.iterator()), batch_size=chunk_size))
+
+    bump_versions(SALES)
+    return written
+
+
+def sales_report(seller, first_day, last_day, granularity='day'):
+    """A seller's units and revenue in a date range, per period and per product
+
+    Periods and products without sales are left out.
+    """
+    rollups = SellerSalesDaily.objects.filter(seller=seller, day__range=(first_day, last_day))
+
+    periods = [
+        {'period': row['period'], 'units': row['units'], 'revenue': round(row['revenue'], 2)}
+        for row in rollups.values(period=GRANULARITIES[granularity]())
+        .annotate(units=Sum('units'), revenue=Sum('revenue')).order_by('period')
+    ]
+    products = [
+        {'product': row['product'], 'name': row['name'],
+         'units': row['units'], 'revenue': round(row['revenue'], 2)}
+        for row in rollups.values('product', name=F('product__name'))
+        .annotate(units=Sum('units'), revenue=Sum('revenue')).order_by('-revenue', 'product')
+    ]
+
+    return {
+        'units': sum(period['units'] for period in periods),
+        'revenue': round(sum(period['revenue'] for period in periods), 2),
+        'periods': periods,
+        'products': products,
+    }
+
+
+def _rollup(row):
+    return SellerSalesDaily(seller_id=row['seller'], product_id=row['product'], day=row['day'],
+                            units=row['units'], revenue=row['revenue'])
@@ -0,0 +1,116 @@
+"""Full-text product search backed by an SQLite FTS5 index
+
+The index is a separate FTS5 virtual table with one row per visible product,
+keyed by the product id. The handlers in bangazonapi/signals.py keep it in
+sync as products are saved, soft deleted, restored or removed. Rebuild it
+from scratch with `python manage.py rebuild_search_index`.
+
+On databases other than SQLite, search falls back to a case insensitive
+substring match on the same columns.
+"""
+import re
+from django.db import connections
+from django.db.models import F, Q
+from bangazonapi.models import Product, ProductSearch
+
+
+SEARCH_TABLE = ProductSearch._meta.db_table
+SEARCH_COLUMNS = ('name', 'description', 'location')
+
+
+def _uses_fts(using='default'):
+    return connections[using].vendor == 'sqlite'
+
+
+def create_search_index(sender=None, using='default', **kwargs):
+    """Create the FTS5 table if it is missing. Connected to post_migrate."""
+    if not _uses_fts(using):
+        return
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+            f"USING fts5({', '.join(SEARCH_COLUMNS)}, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+
+def index_product(product, using='default'):
+    """Add or refresh one product in the search index"""
+    if not _uses_fts(using):
+        return
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [product.pk])
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, {', '.join(SEARCH_COLUMNS)}) "
+            f"VALUES (%s, {', '.join(['%s'] * len(SEARCH_COLUMNS))})",
+            [product.pk] + [getattr(product, column) for column in SEARCH_COLUMNS]
+        )
+
+
+def unindex_product(product, using='default'):
+    """Remove one product from the search index"""
+    if not _uses_fts(using):
+        return
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [product.pk])
+
+
+def rebuild_search_index(using='default'):
+    """Re-index every product that is not soft deleted
+
+    Returns:
+        int -- Number of products indexed
+    """
+    if not _uses_fts(using):
+        return 0
+
+    create_search_index(using=using)
+    product_table = Product._meta.db_table
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, {', '.join(SEARCH_COLUMNS)}) "
+            f"SELECT id, {', '.join(SEARCH_COLUMNS)} FROM {product_table} WHERE deleted IS NULL"
+        )
+        cursor.execute(f"SELECT COUNT(*) FROM {SEARCH_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def search_terms(text):
+    """Split free text into the words to search for"""
+    return re.findall(r'\w+', text)
+
+
+def search_products(queryset, text):
+    """Narrow a product queryset to matches for `text`, best matches first
+
+    Arguments:
+        queryset -- Product queryset to search within
+        text -- Free text search from the user
+
+    Returns:
+        QuerySet -- Matching products, annotated with search_rank and ordered by it
+    """
+    terms = search_terms(text)
+    if not terms:
+        return queryset.none()
+
+    if not _uses_fts(queryset.db):
+        for term in terms:
+            queryset = queryset.filter(
+                Q(name__icontains=term) |
+                Q(description__icontains=term) |
+                Q(location__icontains=term)
+            )
+        return queryset
+
+    # Quote every word so user input can never be read as FTS5 query syntax,
+    # and let the last word match as a prefix for search-as-you-type
+    match = ' '.join(f'"{term}"' for term in terms) + '*'
+
+    return queryset.filter(search__document__match=match).annotate(
+        search_rank=F('search__rank')
+    ).order_by('search_rank', 'id')
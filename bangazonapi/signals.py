@@ -0,0 +1,225 @@
+"""Signal handlers that keep denormalized data in sync with its source rows"""
+from django.contrib.auth.models import User
+from django.db.models import Count, F
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import Signal, receiver
+from rest_framework.authtoken.models import Token
+from bangazonapi.authentication import token_cache
+from bangazonapi.cache import PRODUCT_CATEGORIES, PRODUCT_LIST, bump_versions
+from bangazonapi.cache import customer_scope, orders_scope, product_scope
+from bangazonapi.models import Customer, Order, OrderProduct, Payment, Product
+from bangazonapi.models import ProductCategory, ProductRating, Recommendation
+from bangazonapi.search import index_product, unindex_product
+from bangazonapi.sales import record_order_sales
+from bangazonapi.similar import record_order
+
+
+# Sent once, inside the saving transaction, when an order first receives
+# a payment type. Receivers get the paid `order` as a keyword argument.
+order_paid = Signal()
+
+
+def adjust_sold_counts(line_items, direction=1):
+    """Add (or with direction=-1, remove) line items to product sales counts
+
+    Arguments:
+        line_items -- OrderProduct queryset to count
+        direction -- 1 to add the items, -1 to remove them
+    """
+    units_per_product = line_items.order_by().values('product').annotate(units=Count('id'))
+
+    for row in units_per_product:
+        Product.all_objects.filter(pk=row['product']).update(
+            sold_count=F('sold_count') + direction * row['units'])
+        bump_versions(product_scope(row['product']), PRODUCT_LIST)
+
+
+@receiver(post_init, sender=Order)
+def remember_order_payment(sender, instance, **kwargs):
+    """Track the payment type an order was loaded with"""
+    # Read through __dict__ so deferred fields are not fetched here
+    instance._loaded_payment_type_id = instance.__dict__.get('payment_type_id')
+
+
+@receiver(post_save, sender=Order)
+def detect_order_payment(sender, instance, created, raw=False, **kwargs):
+    """Send order_paid when an order transitions from open to paid"""
+    was_paid = instance._loaded_payment_type_id is not None
+    instance._loaded_payment_type_id = instance.payment_type_id
+
+    if raw or was_paid or instance.payment_type_id is None:
+        return
+
+    order_paid.send(sender=Order, order=instance)
+
+
+@receiver(order_paid)
+def add_order_to_sales(sender, order, **kwargs):
+    """Count the line items of a newly paid order as sold"""
+    adjust_sold_counts(OrderProduct.objects.filter(order=order))
+
+
+@receiver(order_paid)
+def add_order_to_similar_products(sender, order, **kwargs):
+    """Count the products of a newly paid order as bought together"""
+    record_order(order)
+
+
+@receiver(order_paid)
+def add_order_to_seller_sales(sender, order, **kwargs):
+    """Add a newly paid order to its sellers' daily rollups"""
+    record_order_sales(order)
+
+
+@receiver(post_save, sender=OrderProduct)
+def add_line_item_to_sales(sender, instance, created, raw=False, **kwargs):
+    """Count line items added to an order that is already paid"""
+    if raw or not created or instance.order.payment_type_id is None:
+        return
+
+    Product.all_objects.filter(pk=instance.product_id).update(
+        sold_count=F('sold_count') + 1)
+    bump_versions(product_scope(instance.product_id), PRODUCT_LIST)
+
+
+@receiver(post_delete, sender=OrderProduct)
+def remove_line_item_from_sales(sender, instance, **kwargs):
+    """Stop counting line items removed from a paid order"""
+    if instance.order.payment_type_id is None:
+        return
+
+    Product.all_objects.filter(pk=instance.product_id).update(
+        sold_count=F('sold_count') - 1)
+    bump_versions(product_scope(instance.product_id), PRODUCT_LIST)
+
+
+@receiver(post_init, sender=ProductRating)
+def remember_rating(sender, instance, **kwargs):
+    """Track the score a rating was loaded with"""
+    instance._loaded_rating = instance.__dict__.get('rating')
+
+
+@receiver(post_save, sender=ProductRating)
+def add_rating_to_product(sender, instance, created, raw=False, **kwargs):
+    """Fold a new or changed rating into the product rating totals"""
+    previous = instance._loaded_rating
+    instance._loaded_rating = instance.rating
+
+    if raw:
+        return
+
+    if created:
+        Product.all_objects.filter(pk=instance.product_id).update(
+            rating_sum=F('rating_sum') + instance.rating,
+            rating_count=F('rating_count') + 1)
+    elif previous is not None and previous != instance.rating:
+        Product.all_objects.filter(pk=instance.product_id).update(
+            rating_sum=F('rating_sum') + instance.rating - previous)
+
+    bump_versions(product_scope(instance.product_id), PRODUCT_LIST)
+
+
+@receiver(post_delete, sender=ProductRating)
+def remove_rating_from_product(sender, instance, **kwargs):
+    """Take a deleted rating out of the product rating totals"""
+    Product.all_objects.filter(pk=instance.product_id).update(
+        rating_sum=F('rating_sum') - instance.rating,
+        rating_count=F('rating_count') - 1)
+    bump_versions(product_scope(instance.product_id), PRODUCT_LIST)
+
+
+@receiver(post_save, sender=Product)
+def sync_product_search(sender, instance, raw=False, using='default', **kwargs):
+    """Keep the search index and cache in step with saves, soft deletes and restores"""
+    if raw:
+        return
+
+    bump_versions(product_scope(instance.pk), PRODUCT_LIST)
+
+    if instance.deleted is None:
+        index_product(instance, using=using)
+    else:
+        unindex_product(instance, using=using)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_search(sender, instance, using='default', **kwargs):
+    """Drop hard deleted products from the search index and cache"""
+    unindex_product(instance, using=using)
+    bump_versions(product_scope(instance.pk), PRODUCT_LIST)
+
+
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+def invalidate_categories(sender, **kwargs):
+    """Drop cached category lists when any category changes"""
+    bump_versions(PRODUCT_CATEGORIES)
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_orders(sender, instance, **kwargs):
+    """Change the version of a customer's orders and cart"""
+    bump_versions(orders_scope(instance.customer_id))
+
+
+@receiver(post_save, sender=OrderProduct)
+@receiver(post_delete, sender=OrderProduct)
+def invalidate_order_line_items(sender, instance, **kwargs):
+    """Change the version of the orders and cart a line item belongs to"""
+    bump_versions(orders_scope(instance.order.customer_id))
+
+
+@receiver(post_save, sender=Customer)
+def invalidate_customer(sender, instance, **kwargs):
+    """Change the version of a customer's profile"""
+    bump_versions(customer_scope(instance.pk))
+
+
+@receiver(post_save, sender=User)
+def invalidate_customer_user(sender, instance, **kwargs):
+    """Change the version of the profiles showing a user's names and email
+
+    That is the user's own profile and the profiles of everyone who
+    recommended a product to them.
+    """
+    customer_ids = list(Customer.objects.filter(user_id=instance.pk).values_list('pk', flat=True))
+    if not customer_ids:
+        return
+    recommender_ids = Recommendation.objects.filter(
+        customer_id__in=customer_ids).values_list('recommender_id', flat=True).distinct()
+    bump_versions(*{customer_scope(customer_id) for customer_id in customer_ids + list(recommender_ids)})
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def invalidate_customer_payments(sender, instance, **kwargs):
+    """Change the version of the profile listing a payment type"""
+    bump_versions(customer_scope(instance.customer_id))
+
+
+@receiver(post_save, sender=Recommendation)
+@receiver(post_delete, sender=Recommendation)
+def invalidate_customer_recommendations(sender, instance, **kwargs):
+    """Change the version of the profile listing a recommendation"""
+    bump_versions(customer_scope(instance.recommender_id))
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    """Stop authenticating with a token as soon as it is deleted"""
+    token_cache.forget_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user_tokens(sender, instance, **kwargs):
+    """Reload a user's tokens after the user changes, e.g. is deactivated"""
+    token_cache.forget_user(instance.pk)
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def forget_customer_tokens(sender, instance, **kwargs):
+    """Reload the customer attached to a user's requests after it changes"""
+    token_cache.forget_user(instance.user_id)
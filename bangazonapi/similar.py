@@ -0,0 +1,125 @@
+"""Customers who bought this also bought: precomputed co-purchase neighbors
+
+CoPurchase counts, for every pair of products, the paid orders containing
+both. SimilarProducts keeps the top SIMILAR_PRODUCTS_COUNT of those pairs
+per product as one row, so GET /products/{id}/similar reads a single row
+by primary key.
+
+When an order is paid, the order_paid handler in bangazonapi/signals.py
+calls record_order(). That adds the order's pairs and rewrites the
+neighbor lists of the products in the order, which are the only lists a
+new order can change. Line items added to or removed from orders that
+are already paid are not tracked. Rebuild everything from the order
+history with `python manage.py rebuild_similar_products`.
+"""
+from django.conf import settings
+from django.db import connections
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from bangazonapi.models import CoPurchase, Order, OrderProduct, SimilarProducts
+
+
+# Orders with more distinct products than this are left out. They add
+# n * (n - 1) pairs and say little about what goes together.
+MAX_BASKET_SIZE = 50
+
+WRITE_BATCH_SIZE = 2000
+
+
+def neighbor_count():
+    return getattr(settings, 'SIMILAR_PRODUCTS_COUNT', 20)
+
+
+def similar_product_ids(product_id):
+    """Ids of the products most often bought with a product, best first"""
+    neighbors = SimilarProducts.objects.filter(pk=product_id).values_list('neighbors', flat=True)
+    return neighbors.first() or []
+
+
+def record_order(order):
+    """Count the product pairs of a newly paid order and refresh their neighbors"""
+    product_ids = sorted(set(
+        OrderProduct.objects.filter(order=order).values_list('product', flat=True)))
+    if not 2 <= len(product_ids) <= MAX_BASKET_SIZE:
+        return
+
+    pairs = CoPurchase.objects.filter(product__in=product_ids, other__in=product_ids)
+    existing = set(pairs.values_list('product', 'other'))
+    pairs.update(orders=F('orders') + 1)
+    CoPurchase.objects.bulk_create([
+        CoPurchase(product_id=product_id, other_id=other_id, orders=1)
+        for product_id in product_ids
+        for other_id in product_ids
+        if product_id != other_id and (product_id, other_id) not in existing
+    ])
+
+    refresh_neighbors(product_ids)
+
+
+def refresh_neighbors(product_ids=None):
+    """Rewrite the neighbor lists of some products, or of all of them
+
+    Returns:
+        int -- Number of lists written
+    """
+    ranked = CoPurchase.objects.annotate(rank=Window(
+        RowNumber(),
+        partition_by=[F('product')],
+        order_by=[F('orders').desc(), F('other').asc()],
+    )).filter(rank__lte=neighbor_count())
+    if product_ids is not None:
+        ranked = ranked.filter(product__in=product_ids)
+
+    rows = ranked.order_by('product', 'rank').values_list('product', 'other')
+    written = 0
+    batch = []
+    current = None
+
+    for product_id, other_id in rows.iterator(chunk_size=WRITE_BATCH_SIZE):
+        if current is None or current.product_id != product_id:
+            if len(batch) >= WRITE_BATCH_SIZE:
+                written += _write_neighbors(batch)
+                batch = []
+            current = SimilarProducts(product_id=product_id, neighbors=[])
+            batch.append(current)
+        current.neighbors.append(other_id)
+
+    return written + _write_neighbors(batch)
+
+
+def _write_neighbors(batch):
+    SimilarProducts.objects.bulk_create(
+        batch, update_conflicts=True, unique_fields=['product'], update_fields=['neighbors'])
+    return len(batch)
+
+
+def rebuild_similar_products(using='default'):
+    """Recount every pair from the paid orders and rewrite every neighbor list
+
+    Run it inside a transaction.
+
+    Returns:
+        tuple -- Number of pairs counted and of neighbor lists written
+    """
+    line_items = OrderProduct._meta.db_table
+    orders = Order._meta.db_table
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SimilarProducts._meta.db_table}")
+        cursor.execute(f"DELETE FROM {CoPurchase._meta.db_table}")
+        cursor.execute(
+            f"INSERT INTO {CoPurchase._meta.db_table} (product_id, other_id, orders) "
+            f"SELECT a.product_id, b.product_id, COUNT(DISTINCT a.order_id) "
+            f"FROM {line_items} a "
+            f"JOIN {line_items} b ON b.order_id = a.order_id AND b.product_id <> a.product_id "
+            f"WHERE a.order_id IN ("
+            f"  SELECT l.order_id FROM {line_items} l JOIN {orders} o ON o.id = l.order_id "
+            f"  WHERE o.payment_type_id IS NOT NULL "
+            f"  GROUP BY l.order_id HAVING COUNT(DISTINCT l.product_id) BETWEEN 2 AND %s"
+            f") "
+            f"GROUP BY a.product_id, b.product_id",
+            [MAX_BASKET_SIZE]
+        )
+        pairs = cursor.rowcount
+
+    return pairs, refresh_neighbors()
@@ -1,11 +1,59 @@
 """View module for handling requests about customer shopping cart"""
 import datetime
+from collections import Counter
+from django.db import transaction
+from django.db.models import Count, Sum
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
 from rest_framework import status
-from bangazonapi.models import Order, Customer, Product, OrderProduct
+from bangazonapi.models import Order, Product, OrderProduct
+from bangazonapi.cache import bump_versions, orders_scope
+from bangazonapi.conditional import conditional
 from .product import ProductSerializer
-from .order import OrderSerializer
+from .order import OrderSerializer, customer_orders_scopes, with_cart_totals, with_line_items
+
+
+def product_quantities(order):
+    """Line items of an order grouped by product in one query
+
+    Returns:
+        list -- Dicts with the product id, quantity and total price
+    """
+    rows = (OrderProduct.objects.filter(order=order)
+            .values('product')
+            .annotate(quantity=Count('id'), total=Sum('product__price'))
+            .order_by('product'))
+
+    return [dict(row, total=round(row['total'], 2)) for row in rows]
+
+
+# Most lines a single batch request may add or remove
+MAX_BATCH_LINES = 1000
+
+
+def batch_quantities(entries):
+    """Total quantity per product id from a list of {product_id, quantity}
+
+    Raises:
+        ValueError -- If an entry is malformed
+    """
+    if not isinstance(entries, list):
+        raise ValueError('must be a list of {"product_id", "quantity"} objects')
+
+    quantities = Counter()
+    for entry in entries:
+        try:
+            product_id = int(entry['product_id'])
+            quantity = int(entry.get('quantity', 1))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise ValueError('every entry needs an integer product_id and quantity')
+        if quantity < 1:
+            raise ValueError('quantity must be at least 1')
+        quantities[product_id] += quantity
+
+    return quantities
 
 
 class Cart(ViewSet):
@@ -21,16 +69,12 @@ class Cart(ViewSet):
             HTTP/1.1 204 No Content
         @apiParam {Number} product_id Id of product to add
         """
-        current_user = Customer.objects.get(user=request.auth.user)
+        current_user = request.customer
 
-        try:
-            open_order = Order.objects.get(
-                customer=current_user, payment_type__isnull=True)
-        except Order.DoesNotExist as ex:
-            open_order = Order()
-            open_order.created_date = datetime.datetime.now()
-            open_order.customer = current_user
-            open_order.save()
+        # The one-open-order constraint makes this safe against concurrent adds
+        open_order, _ = Order.objects.get_or_create(
+            customer=current_user, payment_type=None,
+            defaults={'created_date': datetime.datetime.now()})
 
         line_item = OrderProduct()
         line_item.product = Product.objects.get(pk=request.data["product_id"])
@@ -50,7 +94,7 @@ class Cart(ViewSet):
         @apiSuccessExample {json} Success
             HTTP/1.1 204 No Content
         """
-        current_user = Customer.objects.get(user=request.auth.user)
+        current_user = request.customer
         open_order = Order.objects.get(
             customer=current_user, payment_type=None)
 
@@ -63,6 +107,104 @@ class Cart(ViewSet):
         return Response({}, status=status.HTTP_204_NO_CONTENT)
 
 
+    @action(methods=['post'], detail=False, permission_classes=[IsAuthenticated])
+    def batch(self, request):
+        """
+        @api {POST} /cart/batch POST several additions and removals at once
+        @apiName BatchLineItems
+        @apiGroup ShoppingCart
+
+        @apiHeader {String} Authorization Auth token
+        @apiHeaderExample {String} Authorization
+            Token 9ba45f09651c5b0c404f37a2d2572c026c146611
+
+        @apiParam {Object[]} add Products to add to the cart
+        @apiParam {id} add.product_id Id of product to add
+        @apiParam {Number} add.quantity How many to add, 1 if not given
+        @apiParam {Object[]} remove Products to remove from the cart
+        @apiParam {id} remove.product_id Id of product to remove
+        @apiParam {Number} remove.quantity How many to remove, 1 if not given
+        @apiParamExample {json} Input
+            {
+                "add": [
+                    { "product_id": 52, "quantity": 2 },
+                    { "product_id": 12 }
+                ],
+                "remove": [
+                    { "product_id": 7, "quantity": 1 }
+                ]
+            }
+
+        @apiSuccess (200) {Number} added Number of line items added
+        @apiSuccess (200) {Number} removed Number of line items removed
+        @apiSuccessExample {json} Success
+            {
+                "added": 3,
+                "removed": 1
+            }
+        @apiError (400) {String} message Invalid entries or unknown products
+        """
+        if not hasattr(request.data, 'get'):
+            return Response({'message': 'Send an object with "add" and "remove" lists'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            additions = batch_quantities(request.data.get('add', []))
+            removals = batch_quantities(request.data.get('remove', []))
+        except ValueError as ex:
+            return Response({'message': ex.args[0]}, status=status.HTTP_400_BAD_REQUEST)
+
+        if sum(additions.values()) + sum(removals.values()) > MAX_BATCH_LINES:
+            return Response(
+                {'message': f'A batch can change at most {MAX_BATCH_LINES} line items'},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        found = set(Product.objects.filter(pk__in=additions).values_list('id', flat=True))
+        missing = sorted(set(additions) - found)
+        if missing:
+            return Response(
+                {'message': f'Products do not exist: {", ".join(map(str, missing))}'},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        current_user = request.customer
+        added = removed = 0
+
+        with transaction.atomic():
+            if additions:
+                open_order, _ = Order.objects.get_or_create(
+                    customer=current_user, payment_type=None,
+                    defaults={'created_date': datetime.datetime.now()})
+                created = OrderProduct.objects.bulk_create([
+                    OrderProduct(order=open_order, product_id=product_id)
+                    for product_id, quantity in additions.items()
+                    for _ in range(quantity)
+                ])
+                added = len(created)
+
+            if removals:
+                # Newest lines first, up to the requested quantity of each product
+                lines = (OrderProduct.objects
+                         .filter(order__customer=current_user, order__payment_type=None,
+                                 product_id__in=removals)
+                         .order_by('-id')
+                         .values_list('id', 'product_id'))
+                remaining = Counter(removals)
+                doomed = []
+                for line_id, product_id in lines:
+                    if remaining[product_id] > 0:
+                        remaining[product_id] -= 1
+                        doomed.append(line_id)
+
+                removed, _ = OrderProduct.objects.filter(pk__in=doomed).delete()
+
+            # bulk_create() sends no post_save, so the receivers that bump
+            # the cart's version on each line item do not run for additions
+            if added or removed:
+                bump_versions(orders_scope(current_user.id))
+
+        return Response({'added': added, 'removed': removed})
+
+    @conditional(customer_orders_scopes)
     def list(self, request):
         """
         @api {GET} /cart GET line items in cart
@@ -75,6 +217,11 @@ class Cart(ViewSet):
         @apiSuccess (200) {Object} payment_type Payment id use to complete order
         @apiSuccess (200) {String} customer URI for customer
         @apiSuccess (200) {Number} size Number of items in cart
+        @apiSuccess (200) {Number} subtotal Sum of the prices of the items in cart
+        @apiSuccess (200) {Object[]} quantities Items in cart grouped by product
+        @apiSuccess (200) {id} quantities.product Product id
+        @apiSuccess (200) {Number} quantities.quantity Number of that product in cart
+        @apiSuccess (200) {Number} quantities.total Price of all of that product in cart
         @apiSuccess (200) {Object[]} line_items Line items in cart
         @apiSuccess (200) {Number} line_items.id Line item id
         @apiSuccess (200) {Object} line_items.product Product in cart
@@ -104,16 +251,24 @@ class Cart(ViewSet):
                         }
                     }
                 ],
-                "size": 1
+                "size": 1,
+                "subtotal": 1296.98,
+                "quantities": [
+                    {
+                        "product": 52,
+                        "quantity": 1,
+                        "total": 1296.98
+                    }
+                ]
             }
         """
-        current_user = Customer.objects.get(user=request.auth.user)
+        current_user = request.customer
         try:
-            open_order = Order.objects.get(
+            open_order = with_cart_totals(with_line_items(Order.objects)).get(
                 customer=current_user, payment_type=None)
 
-            products_on_order = Product.objects.filter(
-                lineitems__order=open_order)
+            # Products come from the prefetched line items, one per line
+            products_on_order = [line_item.product for line_item in open_order.lineitems.all()]
 
             serialized_order = OrderSerializer(
                 open_order, many=False, context={'request': request})
@@ -125,7 +280,9 @@ class Cart(ViewSet):
                 "order": serialized_order.data
             }
             final["order"]["products"] = product_list.data
-            final["order"]["size"] = len(products_on_order)
+            final["order"]["size"] = open_order.size
+            final["order"]["subtotal"] = round(open_order.subtotal, 2)
+            final["order"]["quantities"] = product_quantities(open_order)
 
         except Order.DoesNotExist as ex:
             return Response({'message': ex.args[0]}, status=status.HTTP_404_NOT_FOUND)
@@ -33,12 +33,14 @@ class Customers(ViewSet):
         @apiSuccessExample {json} Success
             HTTP/1.1 204 No Content
         """
-        customer = Customer.objects.get(user=request.auth.user)
+        # request.customer is rebuilt from cached rows that may be stale, so
+        # read the rows again and write back only the columns changed here
+        customer = Customer.objects.select_related('user').get(pk=request.customer.pk)
         customer.user.last_name = request.data["last_name"]
         customer.user.email = request.data["email"]
         customer.address = request.data["address"]
         customer.phone_number = request.data["phone_number"]
-        customer.user.save()
-        customer.save()
+        customer.user.save(update_fields=['last_name', 'email'])
+        customer.save(update_fields=['address', 'phone_number'])
 
         return Response({}, status=status.HTTP_204_NO_CONTENT)
@@ -5,7 +5,7 @@ from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
 from rest_framework import serializers
 from rest_framework import status
-from bangazonapi.models import OrderProduct, Order, Product, Customer
+from bangazonapi.models import OrderProduct, Order, Product
 
 
 class LineItemSerializer(serializers.HyperlinkedModelSerializer):
@@ -50,7 +50,7 @@ class LineItems(ViewSet):
         """
         try:
             # line_item = OrderProduct.objects.get(pk=pk)
-            customer = Customer.objects.get(user=request.auth.user)
+            customer = request.customer
             line_item = OrderProduct.objects.get(pk=pk, order__customer=customer)
 
             serializer = LineItemSerializer(line_item, context={'request': request})
@@ -75,7 +75,7 @@ class LineItems(ViewSet):
             HTTP/1.1 204 No Content
         """
         try:
-            customer = Customer.objects.get(user=request.auth.user)
+            customer = request.customer
             order_product = OrderProduct.objects.get(pk=pk, order__customer=customer)
 
             return Response({}, status=status.HTTP_204_NO_CONTENT)
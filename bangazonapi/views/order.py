@@ -1,12 +1,19 @@
 """View module for handling requests about customer order"""
 import datetime
+from django.db.models import Count, Prefetch, Sum
+from django.db.models.functions import Coalesce
 from django.http import HttpResponseServerError
 from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
 from rest_framework import serializers
 from rest_framework import status
 from rest_framework.decorators import action
-from bangazonapi.models import Order, Payment, Customer, Product, OrderProduct
+from bangazonapi.models import Order, Payment, Product, OrderProduct
+from bangazonapi.cache import PRODUCTS, PRODUCT_LIST, orders_scope
+from bangazonapi.checkout import CheckoutError, checkout
+from bangazonapi.conditional import conditional
+from bangazonapi.fieldsets import DynamicFieldsMixin, Expandable
+from bangazonapi.pagination import CreatedDateCursorPagination, PaginatedViewSetMixin
 from .product import ProductSerializer
 
 
@@ -24,6 +31,50 @@ class OrderLineItemSerializer(serializers.HyperlinkedModelSerializer):
         fields = ('id', 'product')
         depth = 1
 
+def with_line_items(orders):
+    """Prefetch everything OrderSerializer reads for a queryset of orders
+
+    Line items and their products come back in one extra query no matter
+    how many orders are serialized. Product sales and rating figures are
+    stored on the product row, so they need no further queries.
+
+    Arguments:
+        orders -- Order queryset
+
+    Returns:
+        QuerySet -- The orders with line items and products prefetched
+    """
+    return orders.prefetch_related(
+        Prefetch(
+            'lineitems',
+            queryset=OrderProduct.objects.select_related('product').order_by('id')
+        )
+    )
+
+
+def with_cart_totals(orders):
+    """Annotate each order with its line count and subtotal, summed in SQL
+
+    Arguments:
+        orders -- Order queryset
+
+    Returns:
+        QuerySet -- The orders annotated with size and subtotal
+    """
+    return orders.annotate(
+        size=Count('lineitems'),
+        subtotal=Coalesce(Sum('lineitems__product__price'), 0.0),
+    )
+
+
+def customer_orders_scopes(viewset, request, *args, **kwargs):
+    """Cache scopes of a response built from the caller's orders and their products"""
+    if request.customer is None:
+        return None
+
+    return (orders_scope(request.customer.id), PRODUCTS, PRODUCT_LIST)
+
+
 class OrderSerializer(serializers.HyperlinkedModelSerializer):
     """JSON serializer for customer orders"""
 
@@ -38,9 +89,37 @@ class OrderSerializer(serializers.HyperlinkedModelSerializer):
         fields = ('id', 'url', 'created_date', 'payment_type', 'customer', 'lineitems')
 
 
-class Orders(ViewSet):
+class OrderSummarySerializer(DynamicFieldsMixin, serializers.HyperlinkedModelSerializer):
+    """JSON serializer for orders, with their line items on request
+
+    Reads the size and subtotal annotations added by with_cart_totals().
+    """
+
+    status = serializers.SerializerMethodField()
+    size = serializers.IntegerField(read_only=True)
+    total = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Order
+        fields = ('id', 'url', 'created_date', 'payment_type', 'status', 'size', 'total')
+        expandable_fields = {
+            'lineitems': Expandable(OrderLineItemSerializer, queryset=with_line_items, many=True),
+        }
+        field_columns = {'status': ('payment_type',)}
+        field_querysets = {'size': with_cart_totals, 'total': with_cart_totals}
+
+    def get_status(self, order):
+        return 'open' if order.payment_type_id is None else 'paid'
+
+    def get_total(self, order):
+        return round(order.subtotal, 2)
+
+
+class Orders(PaginatedViewSetMixin, ViewSet):
     """View for interacting with customer orders"""
+    cursor_pagination_class = CreatedDateCursorPagination
 
+    @conditional(customer_orders_scopes)
     def retrieve(self, request, pk=None):
         """
         @api {GET} /cart/:id GET single order
@@ -68,8 +147,8 @@ class Orders(ViewSet):
             }
         """
         try:
-            customer = Customer.objects.get(user=request.auth.user)
-            order = Order.objects.get(pk=pk, customer=customer)
+            customer = request.customer
+            order = with_line_items(Order.objects).get(pk=pk, customer=customer)
             serializer = OrderSerializer(order, context={'request': request})
             return Response(serializer.data)
 
@@ -101,14 +180,38 @@ class Orders(ViewSet):
 
         @apiSuccessExample {json} Success
             HTTP/1.1 204 No Content
+
+        @apiError (404) {String} message Order or payment type not found
+        @apiError (409) {String} message Why checkout failed
+        @apiError (409) {Object[]} failures Products without enough stock
+        @apiError (409) {id} failures.product Product id
+        @apiError (409) {Number} failures.requested Number in the order
+        @apiError (409) {Number} failures.available Number in stock
+        @apiErrorExample {json} Out of stock
+            HTTP/1.1 409 Conflict
+            {
+                "message": "Some products are out of stock.",
+                "failures": [
+                    { "product": 52, "requested": 2, "available": 1 }
+                ]
+            }
         """
-        customer = Customer.objects.get(user=request.auth.user)
-        order = Order.objects.get(pk=pk, customer=customer)
-        order.payment_type = request.data["payment_type"]
-        order.save()
+        customer = request.customer
+        try:
+            order = Order.objects.get(pk=pk, customer=customer)
+            payment = Payment.objects.get(pk=request.data["payment_type"], customer=customer)
+        except (Order.DoesNotExist, Payment.DoesNotExist) as ex:
+            return Response({'message': ex.args[0]}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            checkout(order, payment)
+        except CheckoutError as ex:
+            return Response({'message': ex.args[0], 'failures': ex.failures},
+                            status=status.HTTP_409_CONFLICT)
 
         return Response({}, status=status.HTTP_204_NO_CONTENT)
 
+    @conditional(customer_orders_scopes)
     def list(self, request):
         """
         @api {GET} /orders GET customer orders
@@ -119,34 +222,68 @@ class Orders(ViewSet):
         @apiHeaderExample {String} Authorization
             Token 9ba45f09651c5b0c404f37a2d2572c026c146611
 
-        @apiParam {id} payment_id Query param to filter by payment used
+        @apiParam {id} [payment_id] Query param to filter by payment used
+        @apiParam {String="open","paid"} [status] Query param to filter to the cart or to paid orders
+        @apiParam {Date} [from] Query param for the earliest created_date, YYYY-MM-DD
+        @apiParam {Date} [to] Query param for the latest created_date, YYYY-MM-DD
+        @apiParam {String} [fields] Query param naming the fields to send, comma separated
+        @apiParam {String} [omit] Query param naming fields to leave out, comma separated
+        @apiParam {String="lineitems"} [expand] Query param to include line items and their products
+        @apiParam {Number} limit Query param for page size (at most 100)
+        @apiParam {Number} offset Query param for the index of the first order on the page
+        @apiParam {String} cursor Query param to page newest first by keyset instead. Send it empty for the first page.
 
-        @apiSuccess (200) {Object[]} orders Array of order objects
-        @apiSuccess (200) {id} orders.id Order id
-        @apiSuccess (200) {String} orders.url Order URI
-        @apiSuccess (200) {String} orders.created_date Date order was created
-        @apiSuccess (200) {String} orders.payment_type Payment URI
-        @apiSuccess (200) {String} orders.customer Customer URI
+        @apiSuccess (200) {Number} count Number of matching orders (not sent in cursor mode)
+        @apiSuccess (200) {String} next URL of the next page
+        @apiSuccess (200) {String} previous URL of the previous page
+        @apiSuccess (200) {Object[]} results Array of order objects
+        @apiSuccess (200) {id} results.id Order id
+        @apiSuccess (200) {String} results.url Order URI
+        @apiSuccess (200) {String} results.created_date Date order was created
+        @apiSuccess (200) {String} results.payment_type Payment URI
+        @apiSuccess (200) {String} results.status "open" for the cart, "paid" otherwise
+        @apiSuccess (200) {Number} results.size Number of line items
+        @apiSuccess (200) {Number} results.total Sum of the prices of the line items
+        @apiSuccess (200) {Object[]} results.lineitems Line items with their products (expanded only)
 
         @apiSuccessExample {json} Success
-            [
-                {
-                    "id": 1,
-                    "url": "http://localhost:8000/orders/1",
-                    "created_date": "2019-08-16",
-                    "payment_type": "http://localhost:8000/paymenttypes/1",
-                    "customer": "http://localhost:8000/customers/5"
-                }
-            ]
+            {
+                "count": 1,
+                "next": null,
+                "previous": null,
+                "results": [
+                    {
+                        "id": 1,
+                        "url": "http://localhost:8000/orders/1",
+                        "created_date": "2019-08-16",
+                        "payment_type": "http://localhost:8000/paymenttypes/1",
+                        "status": "paid",
+                        "size": 3,
+                        "total": 44.97
+                    }
+                ]
+            }
         """
-        customer = Customer.objects.get(user=request.auth.user)
-        orders = Order.objects.filter(customer=customer)
+        params = request.query_params
+        # Cursor pagination reads created_date whatever the fields
+        orders = OrderSummarySerializer.prune(
+            Order.objects.filter(customer=request.customer), request, 'created_date').order_by('id')
 
-        payment = self.request.query_params.get('payment_id', None)
-        if payment is not None:
-            orders = orders.filter(payment__id=payment)
+        order_status = params.get('status', None)
+        if order_status not in (None, 'open', 'paid'):
+            return Response({'message': 'status must be open or paid'}, status=status.HTTP_400_BAD_REQUEST)
+        if order_status is not None:
+            orders = orders.filter(payment_type__isnull=order_status == 'open')
 
-        json_orders = OrderSerializer(
-            orders, many=True, context={'request': request})
+        try:
+            if 'payment_id' in params:
+                orders = orders.filter(payment_type=int(params['payment_id']))
+            if 'from' in params:
+                orders = orders.filter(created_date__gte=datetime.date.fromisoformat(params['from']))
+            if 'to' in params:
+                orders = orders.filter(created_date__lte=datetime.date.fromisoformat(params['to']))
+        except ValueError:
+            return Response({'message': 'payment_id must be a number, and from and to dates like 2019-10-30'},
+                            status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(json_orders.data)
+        return self.paginated_response(orders, OrderSummarySerializer)
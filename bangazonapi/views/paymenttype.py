@@ -4,10 +4,12 @@ from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
 from rest_framework import serializers
 from rest_framework import status
-from bangazonapi.models import Payment, Customer
+from bangazonapi.models import Payment
+from bangazonapi.fieldsets import DynamicFieldsMixin
+from bangazonapi.pagination import PaginatedViewSetMixin
 
 
-class PaymentSerializer(serializers.HyperlinkedModelSerializer):
+class PaymentSerializer(DynamicFieldsMixin, serializers.HyperlinkedModelSerializer):
     """JSON serializer for Payment
 
     Arguments:
@@ -23,7 +25,7 @@ class PaymentSerializer(serializers.HyperlinkedModelSerializer):
                   'expiration_date', 'create_date')
 
 
-class Payments(ViewSet):
+class Payments(PaginatedViewSetMixin, ViewSet):
 
     def create(self, request):
         """Handle POST operations
@@ -36,7 +38,7 @@ class Payments(ViewSet):
         new_payment.account_number = request.data["account_number"]
         new_payment.expiration_date = request.data["create_date"]
         new_payment.create_date = request.data["expiration_date"]
-        customer = Customer.objects.get(user=request.auth.user)
+        customer = request.customer
         new_payment.customer = customer
         new_payment.save()
 
@@ -51,8 +53,9 @@ class Payments(ViewSet):
         Returns:
             Response -- JSON serialized payment_type instance
         """
+        payment_types = PaymentSerializer.prune(Payment.objects.all(), request)
         try:
-            payment_type = Payment.objects.get(pk=pk)
+            payment_type = payment_types.get(pk=pk)
             serializer = PaymentSerializer(
                 payment_type, context={'request': request})
             return Response(serializer.data)
@@ -78,14 +81,16 @@ class Payments(ViewSet):
             return Response({'message': ex.args[0]}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     def list(self, request):
-        """Handle GET requests to payment type resource"""
-        payment_types = Payment.objects.all()
+        """Handle GET requests to payment type resource
+
+        Returns:
+            Response -- One page of JSON serialized payment types
+        """
+        payment_types = PaymentSerializer.prune(Payment.objects.all(), request).order_by('id')
 
         customer_id = self.request.query_params.get('customer', None)
 
         if customer_id is not None:
             payment_types = payment_types.filter(customer__id=customer_id)
 
-        serializer = PaymentSerializer(
-            payment_types, many=True, context={'request': request})
-        return Response(serializer.data)
+        return self.paginated_response(payment_types, PaymentSerializer)
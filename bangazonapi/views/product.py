@@ -1,31 +1,73 @@
 """View module for handling requests about products"""
 from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError
 from bangazonapi.models.recommendation import Recommendation
-import base64
-from django.core.files.base import ContentFile
-from django.http import HttpResponseServerError
+from django.conf import settings
+from django.http import HttpResponseServerError, StreamingHttpResponse
 from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
 from rest_framework import serializers
 from rest_framework import status
 from bangazonapi.models import Product, Customer, ProductCategory
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
-from rest_framework.parsers import MultiPartParser, FormParser
-
-
-class ProductSerializer(serializers.ModelSerializer):
+from bangazonapi.cache import PRODUCTS, PRODUCT_CATEGORIES, PRODUCT_LIST, aread_through, product_scope
+from bangazonapi.cache import read_through
+from bangazonapi.conditional import conditional
+from bangazonapi.export import CSVRenderer, NDJSONRenderer, buffered, csv_lines
+from bangazonapi.export import export_rows, ndjson_lines
+from bangazonapi.fieldsets import DynamicFieldsMixin, Expandable
+from bangazonapi.images import IMAGE_VARIANTS, queue_product_image, spool_upload, variant_name
+from bangazonapi.pagination import CreatedDateCursorPagination, PaginatedViewSetMixin
+from bangazonapi.search import search_products
+from bangazonapi.similar import similar_product_ids
+from .productcategory import ProductCategorySerializer
+
+
+class ProductSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """JSON serializer for products"""
+    images = serializers.SerializerMethodField()
+
     class Meta:
         model = Product
         fields = ('id', 'name', 'price', 'number_sold', 'description',
                   'quantity', 'created_date', 'location', 'image_path',
-                  'average_rating', 'can_be_rated', )
+                  'images', 'average_rating', 'can_be_rated', )
         depth = 1
+        expandable_fields = {'category': Expandable(ProductCategorySerializer)}
+        field_columns = {'images': ('image_path',)}
+        field_querysets = {
+            'number_sold': lambda products: products.with_aggregates('number_sold'),
+            'average_rating': lambda products: products.with_aggregates('average_rating'),
+        }
+
+    def get_images(self, product):
+        """URLs of the WebP versions of the product image
+
+        Images stored before the pipeline made variants need
+        `manage.py backfill_product_images` before these URLs resolve.
+        """
+        if not product.image_path:
+            return None
+
+        request = self.context.get('request')
+        urls = {}
+        for variant, suffix in IMAGE_VARIANTS.items():
+            url = product.image_path.storage.url(variant_name(product.image_path.name, suffix))
+            urls[variant] = request.build_absolute_uri(url) if request else url
+        return urls
 
 
-class Products(ViewSet):
+def expanded_scopes(request, *scopes):
+    """Cache scopes of a product response, plus the categories when ?expand=category"""
+    if 'category' in ProductSerializer.select(request).expanded:
+        return scopes + (PRODUCT_CATEGORIES,)
+    return scopes
+
+
+class Products(PaginatedViewSetMixin, ViewSet):
     """Request handlers for Products in the Bangazon Platform"""
     permission_classes = (IsAuthenticatedOrReadOnly,)
+    cursor_pagination_class = CreatedDateCursorPagination
 
     def create(self, request):
         """
@@ -43,6 +85,8 @@ class Products(ViewSet):
         @apiParam {Number} quantity Number of items to sell
         @apiParam {String} location City where product is located
         @apiParam {Number} category_id Category of product
+        @apiParam {File} [image_path] Product image, as a multipart file upload or a base64 data URI.
+            It is processed in the background, so the response may not include it yet.
         @apiParamExample {json} Input
             {
                 "name": "Kite",
@@ -62,6 +106,7 @@ class Products(ViewSet):
         @apiSuccess (200) {Date} product.created_date City where product is located
         @apiSuccess (200) {String} product.location City where product is located
         @apiSuccess (200) {String} product.image_path Path to product image
+        @apiSuccess (200) {Object} product.images WebP versions of the image: "full" and "thumb"
         @apiSuccess (200) {Number} product.average_rating Average customer rating of product
         @apiSuccess (200) {Number} product.number_sold How many items have been purchased
         @apiSuccess (200) {Object} product.category Category of product
@@ -77,6 +122,7 @@ class Products(ViewSet):
                 "created_date": "2019-10-23",
                 "location": "Pittsburgh",
                 "image_path": null,
+                "images": null,
                 "average_rating": 0,
                 "category": {
                     "url": "http://localhost:8000/productcategories/6",
@@ -91,26 +137,27 @@ class Products(ViewSet):
         new_product.quantity = request.data["quantity"]
         new_product.location = request.data["location"]
 
-        customer = Customer.objects.get(user=request.auth.user)
+        customer = request.customer
         new_product.customer = customer
 
         product_category = ProductCategory.objects.get(pk=request.data["category_id"])
         new_product.category = product_category
 
-        if "image_path" in request.data:
-            format, imgstr = request.data["image_path"].split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name=f'{new_product.id}-{request.data["name"]}.{ext}')
-
-            new_product.image_path = data
-
         new_product.save()
 
+        # Decoding, resizing and storage happen on the image worker pool.
+        # image_path stays null until they are done.
+        image = request.data.get("image_path")
+        if image:
+            queue_product_image(new_product.id, spool_upload(image))
+            new_product.refresh_from_db(fields=['image_path'])
+
         serializer = ProductSerializer(
             new_product, context={'request': request})
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @conditional(lambda self, request, pk=None: expanded_scopes(request, PRODUCTS, product_scope(pk)))
     def retrieve(self, request, pk=None):
         """
         @api {GET} /products/:id GET product
@@ -118,6 +165,9 @@ class Products(ViewSet):
         @apiGroup Product
 
         @apiParam {id} id Product Id
+        @apiParam {String} [fields] Query param naming the fields to send, comma separated
+        @apiParam {String} [omit] Query param naming fields to leave out, comma separated
+        @apiParam {String="category"} [expand] Query param to include the category object
 
         @apiSuccess (200) {Object} product Created product
         @apiSuccess (200) {id} product.id Product Id
@@ -128,6 +178,7 @@ class Products(ViewSet):
         @apiSuccess (200) {Date} product.created_date City where product is located
         @apiSuccess (200) {String} product.location City where product is located
         @apiSuccess (200) {String} product.image_path Path to product image
+        @apiSuccess (200) {Object} product.images WebP versions of the image: "full" and "thumb"
         @apiSuccess (200) {Number} product.average_rating Average customer rating of product
         @apiSuccess (200) {Number} product.number_sold How many items have been purchased
         @apiSuccess (200) {Object} product.category Category of product
@@ -143,6 +194,7 @@ class Products(ViewSet):
                 "created_date": "2019-10-23",
                 "location": "Pittsburgh",
                 "image_path": null,
+                "images": null,
                 "average_rating": 0,
                 "category": {
                     "url": "http://localhost:8000/productcategories/6",
@@ -150,10 +202,16 @@ class Products(ViewSet):
                 }
             }
         """
+        products = ProductSerializer.prune(Product.objects.all(), request)
+
+        def serialize_product():
+            product = products.get(pk=pk)
+            return ProductSerializer(product, context={'request': request}).data
+
         try:
-            product = Product.objects.get(pk=pk)
-            serializer = ProductSerializer(product, context={'request': request})
-            return Response(serializer.data)
+            data = read_through(
+                request, expanded_scopes(request, PRODUCTS, product_scope(pk)), serialize_product)
+            return Response(data)
         except Exception as ex:
             return HttpResponseServerError(ex)
 
@@ -179,7 +237,7 @@ class Products(ViewSet):
         product.created_date = request.data["created_date"]
         product.location = request.data["location"]
 
-        customer = Customer.objects.get(user=request.auth.user)
+        customer = request.customer
         product.customer = customer
 
         product_category = ProductCategory.objects.get(pk=request.data["category_id"])
@@ -214,68 +272,228 @@ class Products(ViewSet):
         except Exception as ex:
             return Response({'message': ex.args[0]}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @conditional(lambda self, request: expanded_scopes(request, PRODUCTS, PRODUCT_LIST))
     def list(self, request):
         """
         @api {GET} /products GET all products
         @apiName ListProducts
         @apiGroup Product
 
-        @apiSuccess (200) {Object[]} products Array of products
+        @apiParam {String} q Query param to search name, description and location, best matches first
+        @apiParam {id} category Query param to filter by category
+        @apiParam {Number} quantity Query param to limit to the newest products. Not allowed with cursor.
+        @apiParam {String} order_by Query param to sort by a field, including number_sold and average_rating
+        @apiParam {String} direction Query param to sort descending with "desc"
+        @apiParam {Number} number_sold Query param to filter to products sold at most this many times
+        @apiParam {Number} min_rating Query param to filter to products rated at least this on average
+        @apiParam {Number} limit Query param for page size (at most 100)
+        @apiParam {Number} offset Query param for the index of the first product on the page
+        @apiParam {String} cursor Query param to page newest first by keyset instead. Send it empty for the first page.
+        @apiParam {String} [fields] Query param naming the fields to send, comma separated
+        @apiParam {String} [omit] Query param naming fields to leave out, comma separated
+        @apiParam {String="category"} [expand] Query param to include the category object
+
+        @apiSuccess (200) {Number} count Number of products matching the filters (not sent in cursor mode)
+        @apiSuccess (200) {String} next URL of the next page
+        @apiSuccess (200) {String} previous URL of the previous page
+        @apiSuccess (200) {Object[]} results Array of products
         @apiSuccessExample {json} Success
-            [
-                {
-                    "id": 101,
-                    "url": "http://localhost:8000/products/101",
-                    "name": "Kite",
-                    "price": 14.99,
-                    "number_sold": 0,
-                    "description": "It flies high",
-                    "quantity": 60,
-                    "created_date": "2019-10-23",
-                    "location": "Pittsburgh",
-                    "image_path": null,
-                    "average_rating": 0,
-                    "category": {
-                        "url": "http://localhost:8000/productcategories/6",
-                        "name": "Games/Toys"
+            {
+                "count": 1,
+                "next": null,
+                "previous": null,
+                "results": [
+                    {
+                        "id": 101,
+                        "url": "http://localhost:8000/products/101",
+                        "name": "Kite",
+                        "price": 14.99,
+                        "number_sold": 0,
+                        "description": "It flies high",
+                        "quantity": 60,
+                        "created_date": "2019-10-23",
+                        "location": "Pittsburgh",
+                        "image_path": null,
+                        "average_rating": 0,
+                        "category": {
+                            "url": "http://localhost:8000/productcategories/6",
+                            "name": "Games/Toys"
+                        }
                     }
-                }
-            ]
+                ]
+            }
         """
-        products = Product.objects.all()
+        products = self.filter_products(request, self.serialized_products(request))
+        return self.paginated_response(products, ProductSerializer)
+
+    @conditional(lambda self, request: expanded_scopes(request, PRODUCTS, PRODUCT_LIST))
+    async def alist(self, request):
+        """list() for the ASGI deployment, using the async ORM"""
+        products = self.filter_products(request, self.serialized_products(request))
+        return await self.apaginated_response(products, ProductSerializer)
+
+    @conditional(lambda self, request, pk=None: expanded_scopes(request, PRODUCTS, product_scope(pk)))
+    async def aretrieve(self, request, pk=None):
+        """retrieve() for the ASGI deployment, using the async ORM"""
+        products = ProductSerializer.prune(Product.objects.all(), request)
+
+        async def serialize_product():
+            product = await products.aget(pk=pk)
+            return ProductSerializer(product, context={'request': request}).data
+
+        try:
+            data = await aread_through(
+                request, expanded_scopes(request, PRODUCTS, product_scope(pk)), serialize_product)
+            return Response(data)
+        except Exception as ex:
+            return HttpResponseServerError(ex)
+
+    def serialized_products(self, request):
+        """Products with what ProductSerializer reads for the requested fields"""
+        # Cursor pagination reads created_date whatever the fields
+        return ProductSerializer.prune(Product.objects.all(), request, 'created_date')
+
+    def filter_products(self, request, products=None):
+        """Products matching the list query params, not yet evaluated
+
+        Arguments:
+            products -- Queryset to filter, every product with its aggregates by default
+        """
+        if products is None:
+            products = Product.objects.with_aggregates()
+        products = products.order_by('id')
 
         # Support filtering by category and/or quantity
-        category = self.request.query_params.get('category', None)
-        quantity = self.request.query_params.get('quantity', None)
-        order = self.request.query_params.get('order_by', None)
-        direction = self.request.query_params.get('direction', None)
-        number_sold = self.request.query_params.get('number_sold', None)
+        category = request.query_params.get('category', None)
+        quantity = request.query_params.get('quantity', None)
+        order = request.query_params.get('order_by', None)
+        direction = request.query_params.get('direction', None)
+        number_sold = request.query_params.get('number_sold', None)
+        min_rating = request.query_params.get('min_rating', None)
+        search = request.query_params.get('q', None)
+
+        try:
+            number_sold = None if number_sold is None else int(number_sold)
+            min_rating = None if min_rating is None else float(min_rating)
+        except ValueError:
+            raise ParseError('number_sold must be a whole number and min_rating a number')
+
+        if search is not None:
+            products = search_products(products, search)
+
+        if category is not None:
+            products = products.filter(category__id=category)
+
+        if number_sold is not None:
+            products = products.with_aggregates('number_sold').filter(number_sold__lte=number_sold)
+
+        if min_rating is not None:
+            products = products.with_aggregates('average_rating').filter(average_rating__gte=min_rating)
 
         if order is not None:
             order_filter = order
 
+            if order in ('number_sold', 'average_rating'):
+                products = products.with_aggregates(order)
+
             if direction is not None:
                 if direction == "desc":
                     order_filter = f'-{order}'
 
             products = products.order_by(order_filter)
 
-        if category is not None:
-            products = products.filter(category__id=category)
-
         if quantity is not None:
-            products = products.order_by("-created_date")[:int(quantity)]
+            # Keyset pages filter and reorder the queryset, which a slice forbids
+            if self.cursor_pagination_class.cursor_query_param in request.query_params:
+                raise ParseError('quantity cannot be combined with cursor')
+            try:
+                quantity = int(quantity)
+            except ValueError:
+                raise ParseError('quantity must be a whole number')
+            products = products.order_by("-created_date")[:quantity]
+
+        return products
+
+    @action(methods=['get'], detail=False, renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        """
+        @api {GET} /products/export GET the whole catalog as a stream
+        @apiName ExportProducts
+        @apiGroup Product
 
-        if number_sold is not None:
-            def sold_filter(product):
-                if product.number_sold <= int(number_sold):
-                    return True
-                return False
+        @apiParam {String="ndjson","csv"} [format=ndjson] Output format. Also chosen by the Accept header.
+        @apiParam {Number} [category] Same filters as GET /products, without pagination
 
-            products = filter(sold_filter, products)
+        @apiSuccess (200) {String} body One product per line, with the fields of GET /products
+            except images and can_be_rated. CSV output starts with a header row.
 
-        serializer = ProductSerializer(
-            products, many=True, context={'request': request})
+        @apiSuccessExample {json} Success
+            HTTP/1.1 200 OK
+            Content-Type: application/x-ndjson
+
+            {"id":101,"name":"Kite","price":14.99,"number_sold":0,"description":"It flies high","quantity":60,"created_date":"2019-10-23","location":"Pittsburgh","image_path":null,"average_rating":0}
+            {"id":102,"name":"Bat","price":9.99,"number_sold":3,"description":"Wooden","quantity":12,"created_date":"2019-10-24","location":"Nashville","image_path":null,"average_rating":4.5}
+        """
+        rows = export_rows(self.filter_products(request), request)
+
+        if request.accepted_renderer.format == 'csv':
+            response = StreamingHttpResponse(buffered(csv_lines(rows)), content_type='text/csv; charset=utf-8')
+            response['Content-Disposition'] = 'attachment; filename="products.csv"'
+        else:
+            response = StreamingHttpResponse(buffered(ndjson_lines(rows)), content_type='application/x-ndjson')
+
+        return response
+
+    @action(methods=['get'], detail=True)
+    @conditional(lambda self, request, pk=None: expanded_scopes(request, PRODUCTS, PRODUCT_LIST))
+    def similar(self, request, pk=None):
+        """
+        @api {GET} /products/:id/similar GET products often bought with a product
+        @apiName GetSimilarProducts
+        @apiGroup Product
+
+        @apiParam {id} id Product Id
+        @apiParam {Number} [limit=20] Query param for the number of products to return
+        @apiParam {String} [fields] Query param naming the fields to send, comma separated
+        @apiParam {String} [omit] Query param naming fields to leave out, comma separated
+        @apiParam {String="category"} [expand] Query param to include the category object
+
+        @apiSuccess (200) {Object[]} products Products in the most paid orders with this one, most first
+        @apiSuccessExample {json} Success
+            HTTP/1.1 200 OK
+            [
+                {
+                    "id": 52,
+                    "name": "Kite string",
+                    "price": 4.99,
+                    "number_sold": 14,
+                    "description": "Two hundred feet",
+                    "quantity": 80,
+                    "created_date": "2019-10-23",
+                    "location": "Pittsburgh",
+                    "image_path": null,
+                    "images": null,
+                    "average_rating": 4.5
+                }
+            ]
+        """
+        try:
+            limit = int(request.query_params.get('limit', settings.SIMILAR_PRODUCTS_COUNT))
+        except ValueError:
+            return Response({'message': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            product_ids = similar_product_ids(int(pk))
+        except ValueError:
+            return Response({'message': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
+        if not product_ids and not Product.objects.filter(pk=pk).exists():
+            return Response({'message': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        # Deleted products are missing from found, so look them all up
+        found = ProductSerializer.prune(Product.objects.all(), request).in_bulk(product_ids)
+        products = [found[product_id] for product_id in product_ids if product_id in found][:max(limit, 0)]
+
+        serializer = ProductSerializer(products, many=True, context={'request': request})
         return Response(serializer.data)
 
     @action(methods=['post'], detail=True)
@@ -284,7 +502,7 @@ class Products(ViewSet):
 
         if request.method == "POST":
             rec = Recommendation()
-            rec.recommender = Customer.objects.get(user=request.auth.user)
+            rec.recommender = request.customer
             rec.customer = Customer.objects.get(user__id=request.data["recipient"])
             rec.product = Product.objects.get(pk=pk)
 
@@ -12,9 +12,12 @@ from rest_framework import serializers
 from rest_framework import status
 from bangazonapi.models import ProductCategory
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from bangazonapi.cache import PRODUCT_CATEGORIES, aread_through, read_through
+from bangazonapi.fieldsets import DynamicFieldsMixin
+from bangazonapi.pagination import PaginatedViewSetMixin
 
 
-class ProductCategorySerializer(serializers.HyperlinkedModelSerializer):
+class ProductCategorySerializer(DynamicFieldsMixin, serializers.HyperlinkedModelSerializer):
     """JSON serializer for product category"""
     class Meta:
         model = ProductCategory
@@ -25,7 +28,7 @@ class ProductCategorySerializer(serializers.HyperlinkedModelSerializer):
         fields = ('id', 'url', 'name')
 
 
-class ProductCategories(ViewSet):
+class ProductCategories(PaginatedViewSetMixin, ViewSet):
     """Categories for products"""
     permission_classes = (IsAuthenticatedOrReadOnly,)
 
@@ -45,8 +48,9 @@ class ProductCategories(ViewSet):
 
     def retrieve(self, request, pk=None):
         """Handle GET requests for single category"""
+        categories = ProductCategorySerializer.prune(ProductCategory.objects.all(), request)
         try:
-            category = ProductCategory.objects.get(pk=pk)
+            category = categories.get(pk=pk)
             serializer = ProductCategorySerializer(category, context={'request': request})
             return Response(serializer.data)
         except Exception as ex:
@@ -54,13 +58,26 @@ class ProductCategories(ViewSet):
 
     def list(self, request):
         """Handle GET requests to ProductCategory resource"""
-        product_category = ProductCategory.objects.all()
+        product_category = ProductCategorySerializer.prune(
+            ProductCategory.objects.all(), request).order_by('id')
 
         # Support filtering ProductCategorys by area id
         # name = self.request.query_params.get('name', None)
         # if name is not None:
         #     ProductCategories = ProductCategories.filter(name=name)
 
-        serializer = ProductCategorySerializer(
-            product_category, many=True, context={'request': request})
-        return Response(serializer.data)
+        def serialize_categories():
+            return self.paginated_response(product_category, ProductCategorySerializer).data
+
+        return Response(read_through(request, (PRODUCT_CATEGORIES,), serialize_categories))
+
+    async def alist(self, request):
+        """list() for the ASGI deployment, using the async ORM"""
+        product_category = ProductCategorySerializer.prune(
+            ProductCategory.objects.all(), request).order_by('id')
+
+        async def serialize_categories():
+            response = await self.apaginated_response(product_category, ProductCategorySerializer)
+            return response.data
+
+        return Response(await aread_through(request, (PRODUCT_CATEGORIES,), serialize_categories))
@@ -4,20 +4,42 @@ from django.http import HttpResponseServerError
 from django.contrib.auth.models import User
 from rest_framework import serializers, status
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
 from bangazonapi.models import Order, Customer, Product
 from bangazonapi.models import OrderProduct, Favorite
 from bangazonapi.models import Recommendation
+from bangazonapi.cache import PRODUCT_LIST, SALES, customer_scope, sales_scope
+from bangazonapi.conditional import conditional
+from bangazonapi.sales import GRANULARITIES, sales_report
 from .product import ProductSerializer
-from .order import OrderSerializer
+from .order import OrderSerializer, customer_orders_scopes, with_line_items
+
+
+def profile_scopes(viewset, request):
+    """Cache scopes of GET /profile: the customer and the products they recommended"""
+    if request.customer is None:
+        return None
+    return (customer_scope(request.customer.pk), PRODUCT_LIST)
+
+
+def cart_scopes(viewset, request):
+    """Of the /profile/cart methods, only GET is conditional"""
+    if request.method != 'GET':
+        return None
+    return customer_orders_scopes(viewset, request)
+
+
+# Days shown by /profile/sales when no range is given
+DEFAULT_SALES_DAYS = 30
 
 
 class Profile(ViewSet):
     """Request handlers for user profile info in the Bangazon Platform"""
-    permission_classes = (IsAuthenticatedOrReadOnly,)
+    permission_classes = (IsAuthenticated,)
 
+    @conditional(profile_scopes)
     def list(self, request):
         """
         @api {GET} /profile GET user profile info
@@ -80,8 +102,11 @@ class Profile(ViewSet):
                 ]
             }
         """
+        if request.customer is None:
+            return Response({'message': 'No customer profile for this user'}, status=status.HTTP_404_NOT_FOUND)
+
         try:
-            current_user = Customer.objects.get(user=4)
+            current_user = request.customer
             current_user.recommends = Recommendation.objects.filter(recommender=current_user)
 
             serializer = ProfileSerializer(
@@ -91,11 +116,36 @@ class Profile(ViewSet):
         except Exception as ex:
             return HttpResponseServerError(ex)
 
+    @conditional(profile_scopes)
+    async def alist(self, request):
+        """list() for the ASGI deployment, using the async ORM"""
+        if request.customer is None:
+            return Response({'message': 'No customer profile for this user'}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            # Load everything the serializer reads, since it runs in the event loop
+            current_user = await (Customer.objects.select_related('user')
+                                  .prefetch_related('payment_types')
+                                  .aget(pk=request.customer.pk))
+            current_user.recommends = [
+                recommendation async for recommendation in
+                Recommendation.objects.filter(recommender=current_user)
+                .select_related('product', 'customer__user')
+            ]
+
+            serializer = ProfileSerializer(
+                current_user, many=False, context={'request': request})
+
+            return Response(serializer.data)
+        except Exception as ex:
+            return HttpResponseServerError(ex)
+
     @action(methods=['get', 'post', 'delete'], detail=False)
+    @conditional(cart_scopes)
     def cart(self, request):
         """Shopping cart manipulation"""
 
-        current_user = Customer.objects.get(user=request.auth.user)
+        current_user = request.customer
 
         if request.method == "DELETE":
             """
@@ -175,9 +225,9 @@ class Profile(ViewSet):
             @apiError (404) {String} message  Not found message
             """
             try:
-                open_order = Order.objects.get(
+                open_order = with_line_items(Order.objects).get(
                     customer=current_user, payment_type=None)
-                line_items = OrderProduct.objects.filter(order=open_order)
+                line_items = open_order.lineitems.all()
                 line_items = LineItemSerializer(
                     line_items, many=True, context={'request': request})
 
@@ -233,14 +283,9 @@ class Profile(ViewSet):
             @apiError (404) {String} message  Not found message
             """
 
-            try:
-                open_order = Order.objects.get(customer=current_user)
-                print(open_order)
-            except Order.DoesNotExist as ex:
-                open_order = Order()
-                open_order.created_date = datetime.datetime.now()
-                open_order.customer = current_user
-                open_order.save()
+            open_order, _ = Order.objects.get_or_create(
+                customer=current_user, payment_type=None,
+                defaults={'created_date': datetime.datetime.now()})
 
             line_item = OrderProduct()
             line_item.product = Product.objects.get(
@@ -303,7 +348,7 @@ class Profile(ViewSet):
                 }
             ]
         """
-        customer = Customer.objects.get(user=request.auth.user)
+        customer = request.customer
         favorites = Favorite.objects.filter(customer=customer)
 
         serializer = FavoriteSerializer(
@@ -311,6 +356,66 @@ class Profile(ViewSet):
         return Response(serializer.data)
 
 
+    @action(methods=['get'], detail=False, permission_classes=[IsAuthenticated])
+    @conditional(lambda self, request: (SALES, sales_scope(request.customer.pk)) if request.customer else None)
+    def sales(self, request):
+        """
+        @api {GET} /profile/sales GET units and revenue of the products I sell
+        @apiName GetSales
+        @apiGroup UserProfile
+
+        @apiHeader {String} Authorization Auth token
+        @apiHeaderExample {String} Authorization
+            Token 9ba45f09651c5b0c404f37a2d2572c026c146611
+
+        @apiParam {Date} [from] Query param for the first day, YYYY-MM-DD. Defaults to 29 days before to.
+        @apiParam {Date} [to] Query param for the last day, YYYY-MM-DD. Defaults to today.
+        @apiParam {String="day","week","month"} [granularity=day] Query param for the period length
+
+        @apiSuccess (200) {Number} units Units sold on paid orders in the range
+        @apiSuccess (200) {Number} revenue Revenue of those units
+        @apiSuccess (200) {Object[]} periods Units and revenue per period with sales. A period
+            is named by its first day.
+        @apiSuccess (200) {Object[]} products Units and revenue per product with sales, highest revenue first
+        @apiSuccessExample {json} Success
+            HTTP/1.1 200 OK
+            {
+                "from": "2019-10-01",
+                "to": "2019-10-30",
+                "granularity": "week",
+                "units": 3,
+                "revenue": 34.97,
+                "periods": [
+                    {"period": "2019-09-30", "units": 1, "revenue": 14.99},
+                    {"period": "2019-10-21", "units": 2, "revenue": 19.98}
+                ],
+                "products": [
+                    {"product": 12, "name": "Paddle", "units": 2, "revenue": 19.98},
+                    {"product": 11, "name": "Kite", "units": 1, "revenue": 14.99}
+                ]
+            }
+        """
+        granularity = request.query_params.get('granularity', 'day')
+        if granularity not in GRANULARITIES:
+            return Response({'message': f'granularity must be one of {", ".join(GRANULARITIES)}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            last_day = datetime.date.fromisoformat(
+                request.query_params.get('to', datetime.date.today().isoformat()))
+            first_day = datetime.date.fromisoformat(request.query_params.get(
+                'from', (last_day - datetime.timedelta(days=DEFAULT_SALES_DAYS - 1)).isoformat()))
+        except ValueError:
+            return Response({'message': 'from and to must be dates like 2019-10-30'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if first_day > last_day:
+            return Response({'message': 'from must not be after to'}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = sales_report(request.customer, first_day, last_day, granularity)
+        return Response({'from': first_day, 'to': last_day, 'granularity': granularity, **report})
+
+
 class LineItemSerializer(serializers.HyperlinkedModelSerializer):
     """JSON serializer for products
 
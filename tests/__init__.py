@@ -1,3 +1,11 @@
 from .product import ProductTests
 from .order import OrderTests
-from .payments import PaymentTests
\ No newline at end of file
+from .payments import PaymentTests
+from .instrumentation import InstrumentationTests
+from .seeding import SeedingTests
+from .authentication import AuthenticationTests
+from .checkout import CheckoutTests
+from .asgi import AsgiTests
+from .media import MediaTests
+from .renderers import RendererTests
+from .compression import CompressionTests
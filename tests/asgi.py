@@ -0,0 +1,92 @@
+import json
+import inspect
+from django.core.cache import caches
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+from bangazonapi.cache import CACHE_ALIAS
+from bangazonapi.models import Customer, Payment, Product, ProductCategory
+from bangazon.asgi import application
+
+
+class AsgiTests(APITestCase):
+    def setUp(self) -> None:
+        """
+        Create a new account, a category and a product
+        """
+        url = "/register"
+        data = {"username": "steve", "password": "Admin8*", "email": "steve@stevebrownlee.com",
+                "address": "100 Infinity Way", "phone_number": "555-1212", "first_name": "Steve", "last_name": "Brownlee"}
+        response = self.client.post(url, data, format='json')
+        json_response = json.loads(response.content)
+        self.token = json_response["token"]
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        customer = Customer.objects.get(user__username="steve")
+        category = ProductCategory.objects.create(name="Sporting Goods")
+        Product.objects.create(name="Kite", price=14.99, description="It flies high", quantity=60,
+                               location="Pittsburgh", customer=customer, category=category)
+        Payment.objects.create(merchant_name="Visa", account_number="000000000000",
+                               expiration_date="2030-01-01", create_date="2020-01-01", customer=customer)
+
+        self.headers = {"HTTP_AUTHORIZATION": "Token " + self.token}
+
+    def sync_and_async(self, url):
+        """Responses to the same GET from the regular and async views"""
+        caches[CACHE_ALIAS].clear()
+        sync_response = self.client.get(url, **self.headers)
+        caches[CACHE_ALIAS].clear()
+        with override_settings(ROOT_URLCONF='bangazon.asgi_urls'):
+            async_response = self.client.get(url, **self.headers)
+        return sync_response, async_response
+
+    def test_async_views_match_sync_views(self):
+        """
+        Ensure the async views return the same responses as the regular ones.
+        """
+        for url in ("/products", "/products?category=1&limit=1", "/products/1",
+                    "/productcategories", "/profile"):
+            sync_response, async_response = self.sync_and_async(url)
+
+            self.assertEqual(async_response.status_code, status.HTTP_200_OK, url)
+            self.assertEqual(json.loads(async_response.content), json.loads(sync_response.content), url)
+            self.assertEqual(async_response.has_header("ETag"), sync_response.has_header("ETag"), url)
+
+    def test_async_views_report_errors(self):
+        """
+        Ensure authentication and missing objects are handled like the regular views.
+        """
+        with override_settings(ROOT_URLCONF='bangazon.asgi_urls'):
+            response = self.client.get("/profile", HTTP_AUTHORIZATION="Token nope")
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+            response = self.client.get("/profile")
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+            response = self.client.get("/products/99", **self.headers)
+            self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def test_middleware_chain_is_async(self):
+        """
+        Ensure no middleware sends the async views through the sync thread.
+        """
+        application.load_middleware(is_async=True)
+        self.assertTrue(inspect.iscoroutinefunction(application._middleware_chain))
+
+    @override_settings(ROOT_URLCONF='bangazon.asgi_urls')
+    async def test_async_client(self):
+        """
+        Ensure the async views serve conditional GETs, and writes reach the regular views.
+        """
+        headers = {"Authorization": "Token " + self.token}
+        response = await self.async_client.get("/products", headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)["results"][0]["name"], "Kite")
+
+        response = await self.async_client.get(
+            "/products", headers={"If-None-Match": response["ETag"], **headers})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = await self.async_client.post(
+            "/productcategories", {"name": "Kites"}, content_type="application/json", headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
@@ -0,0 +1,129 @@
+import json
+from django.contrib.auth.models import User
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from bangazonapi.authentication import token_cache
+from bangazonapi.models import Customer, Payment, Product, ProductCategory, Recommendation
+
+
+class AuthenticationTests(APITestCase):
+    def setUp(self) -> None:
+        """
+        Create a new account
+        """
+        url = "/register"
+        data = {"username": "steve", "password": "Admin8*", "email": "steve@stevebrownlee.com",
+                "address": "100 Infinity Way", "phone_number": "555-1212", "first_name": "Steve", "last_name": "Brownlee"}
+        response = self.client.post(url, data, format='json')
+        json_response = json.loads(response.content)
+        self.token = json_response["token"]
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        token_cache.clear()
+
+    def test_token_resolves_customer_in_one_query(self):
+        """
+        Ensure the token, user and customer load together, then come from the cache.
+        """
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+        # Token with user and customer, then the profile's payment types and recommendations
+        with self.assertNumQueries(3):
+            response = self.client.get("/profile")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)["user"]["first_name"], "Steve")
+
+        with self.assertNumQueries(2):
+            response = self.client.get("/profile")
+        self.assertEqual(json.loads(response.content)["address"], "100 Infinity Way")
+
+    def test_cached_token_is_invalidated(self):
+        """
+        Ensure customer changes and token deletion take effect on the next request.
+        """
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        self.client.get("/profile")
+
+        customer = Customer.objects.get(user__username="steve")
+        customer.address = "1 Infinite Loop"
+        customer.save()
+        response = self.client.get("/profile")
+        self.assertEqual(json.loads(response.content)["address"], "1 Infinite Loop")
+
+        Token.objects.get(key=self.token).delete()
+        response = self.client.get("/profile")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_update_customer_keeps_changes_from_other_workers(self):
+        """
+        Ensure a profile update writes only its own columns over the cached user and customer.
+        """
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        self.client.get("/profile")
+
+        # Another worker changes the rows without this process hearing of it
+        User.objects.filter(username="steve").update(is_staff=True, first_name="Stephen")
+        user = User.objects.get(username="steve")
+        user.set_password("Changed9*")
+        User.objects.filter(pk=user.pk).update(password=user.password)
+
+        data = {"last_name": "Brown", "email": "steve@example.com", "address": "1 Infinite Loop",
+                "phone_number": "555-9999"}
+        response = self.client.put(f"/customers/{user.customer.pk}", data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        user.refresh_from_db()
+        self.assertTrue(user.is_staff)
+        self.assertEqual(user.first_name, "Stephen")
+        self.assertTrue(user.check_password("Changed9*"))
+        self.assertEqual((user.last_name, user.email), ("Brown", "steve@example.com"))
+        self.assertEqual(user.customer.address, "1 Infinite Loop")
+
+    def test_profile_needs_a_customer(self):
+        """
+        Ensure GET /profile answers anonymous callers and users without a customer with an error.
+        """
+        response = self.client.get("/profile")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        staff = User.objects.create_user(username="admin", password="Admin8*", is_staff=True)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=staff).key)
+        response = self.client.get("/profile")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_profile_is_conditional(self):
+        """
+        Ensure GET /profile answers 304 until the customer, their payments or recommendations change.
+        """
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        customer = Customer.objects.get(user__username="steve")
+
+        def etag_is_current(etag):
+            return self.client.get("/profile", HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_304_NOT_MODIFIED
+
+        etag = self.client.get("/profile")["ETag"]
+        self.assertTrue(etag_is_current(etag))
+
+        Payment.objects.create(merchant_name="Visa", account_number="1111", customer=customer,
+                               expiration_date="2030-01-01", create_date="2020-01-01")
+        self.assertFalse(etag_is_current(etag))
+        etag = self.client.get("/profile")["ETag"]
+
+        friend = User.objects.create_user(username="joe", password="Admin8*", first_name="Joe")
+        friend_customer = Customer.objects.create(user=friend, address="1 Main St", phone_number="555-0000")
+        category = ProductCategory.objects.create(name="Sporting Goods")
+        product = Product.objects.create(name="Kite", price=14.99, description="It flies high", quantity=60,
+                                         location="Pittsburgh", customer=customer, category=category)
+        Recommendation.objects.create(recommender=customer, customer=friend_customer, product=product)
+        self.assertFalse(etag_is_current(etag))
+        etag = self.client.get("/profile")["ETag"]
+
+        friend.first_name = "Joseph"
+        friend.save()
+        self.assertFalse(etag_is_current(etag))
+        response = self.client.get("/profile")
+        self.assertEqual(json.loads(response.content)["recommends"][0]["customer"]["user"]["first_name"], "Joseph")
+
+        product.name = "Box kite"
+        product.save()
+        self.assertFalse(etag_is_current(response["ETag"]))
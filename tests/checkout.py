@@ -0,0 +1,94 @@
+import datetime
+import threading
+from unittest import mock
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection
+from django.test import TransactionTestCase, override_settings
+from bangazonapi.checkout import CheckoutError, checkout
+from bangazonapi.models import Customer, Order, OrderProduct, Payment, Product, ProductCategory
+from bangazonapi.sales import record_order_sales
+
+
+@override_settings(CHECKOUT_ATTEMPTS=50)
+class CheckoutTests(TransactionTestCase):
+    def setUp(self) -> None:
+        """
+        Create a seller and a hot product with little stock
+        """
+        seller = self.create_customer("seller")
+        category = ProductCategory.objects.create(name="Sporting Goods")
+        self.product = Product.objects.create(
+            name="Kite", price=14.99, quantity=5, description="It flies high",
+            category=category, location="Pittsburgh", customer=seller)
+
+    def create_customer(self, username):
+        user = User.objects.create(username=username)
+        return Customer.objects.create(user=user, phone_number="555-1212", address="100 Infinity Way")
+
+    def test_concurrent_checkouts_never_oversell(self):
+        """
+        Ensure many buyers racing for the same product never take more than is in stock.
+        """
+        buyers = 20
+        orders = []
+        for index in range(buyers):
+            customer = self.create_customer(f"buyer{index}")
+            payment = Payment.objects.create(
+                merchant_name="Visa", account_number="1111", customer=customer,
+                expiration_date="2030-01-01", create_date=datetime.date.today())
+            order = Order.objects.create(customer=customer, created_date=datetime.date.today())
+            OrderProduct.objects.create(order=order, product=self.product)
+            orders.append((order, payment))
+
+        outcomes = []
+        start = threading.Barrier(buyers)
+
+        def buy(order, payment):
+            try:
+                start.wait()
+                checkout(order, payment)
+                outcomes.append("paid")
+            except CheckoutError as ex:
+                outcomes.append(ex.failures[0]["available"])
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=pair) for pair in orders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.product.refresh_from_db()
+        self.assertEqual(outcomes.count("paid"), 5)
+        self.assertEqual(sorted(set(outcomes) - {"paid"}), [0])
+        self.assertEqual(self.product.quantity, 0)
+        self.assertEqual(self.product.number_sold, 5)
+        self.assertEqual(Order.objects.filter(payment_type__isnull=False).count(), 5)
+
+    def test_retried_checkout_records_sales(self):
+        """
+        Ensure a checkout retried after a lock error in an order_paid receiver still counts the sale.
+        """
+        customer = self.create_customer("buyer")
+        payment = Payment.objects.create(
+            merchant_name="Visa", account_number="1111", customer=customer,
+            expiration_date="2030-01-01", create_date=datetime.date.today())
+        order = Order.objects.create(customer=customer, created_date=datetime.date.today())
+        OrderProduct.objects.create(order=order, product=self.product)
+
+        failures = [OperationalError("database is locked")]
+
+        def locked_once(order):
+            if failures:
+                raise failures.pop()
+            record_order_sales(order)
+
+        with mock.patch("bangazonapi.signals.record_order_sales", side_effect=locked_once) as record:
+            checkout(order, payment)
+
+        self.assertEqual(record.call_count, 2)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 4)
+        self.assertEqual(self.product.number_sold, 1)
+        self.assertEqual(Order.objects.get(pk=order.pk).payment_type, payment)
@@ -0,0 +1,101 @@
+import gzip
+import json
+import unittest
+from unittest import mock
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+from bangazonapi import compression
+from bangazonapi.compression import brotli, negotiate
+from bangazonapi.models import Customer, Product, ProductCategory
+
+
+@override_settings(COMPRESSION_MIN_SIZE=1024)
+class CompressionTests(APITestCase):
+    def setUp(self) -> None:
+        """
+        Create a seller and enough products for a listing over the size threshold
+        """
+        data = {"username": "steve", "password": "Admin8*", "email": "steve@stevebrownlee.com",
+                "address": "100 Infinity Way", "phone_number": "555-1212", "first_name": "Steve", "last_name": "Brownlee"}
+        self.client.post("/register", data, format='json')
+        customer = Customer.objects.get(user__username="steve")
+        category = ProductCategory.objects.create(name="Sporting Goods")
+        for number in range(10):
+            Product.objects.create(
+                name=f"Kite {number}", price=14.99, description="It flies high " * 15, quantity=60,
+                location="Pittsburgh", customer=customer, category=category)
+
+    def test_compress_listing_once_per_version(self):
+        """
+        Ensure large responses are gzipped, reused from the cache and keep a matching ETag.
+        """
+        plain = self.client.get("/products")
+        self.assertNotIn("Content-Encoding", plain)
+        self.assertIn("Accept-Encoding", plain["Vary"])
+
+        with mock.patch("bangazonapi.middleware.compress", wraps=compression.compress) as compress:
+            response = self.client.get("/products", HTTP_ACCEPT_ENCODING="gzip, deflate")
+            again = self.client.get("/products", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(compress.call_count, 1)
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(again.content, response.content)
+        self.assertLess(int(response["Content-Length"]), len(plain.content))
+        self.assertEqual(response["ETag"], "W/" + plain["ETag"])
+
+        response = self.client.get("/products", HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        for accept_encoding in ("gzip;q=0", "identity", "deflate"):
+            response = self.client.get("/products", HTTP_ACCEPT_ENCODING=accept_encoding)
+            self.assertNotIn("Content-Encoding", response, accept_encoding)
+
+    @override_settings(ROOT_URLCONF='bangazon.asgi_urls')
+    async def test_compress_async_views(self):
+        """
+        Ensure responses from the async views are compressed too.
+        """
+        plain = await self.async_client.get("/products")
+        response = await self.async_client.get("/products", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_small_and_streaming_responses(self):
+        """
+        Ensure small bodies are sent as is and streamed exports are compressed as they stream.
+        """
+        response = self.client.get("/products/1", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertNotIn("Content-Encoding", response)
+        self.assertEqual(json.loads(response.content)["id"], 1)
+
+        plain = b"".join(self.client.get("/products/export").streaming_content)
+        response = self.client.get("/products/export", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), plain)
+
+    def test_negotiate_encoding(self):
+        """
+        Ensure Accept-Encoding q-values and wildcards pick the encoding.
+        """
+        self.assertEqual(negotiate("gzip, deflate"), "gzip")
+        self.assertEqual(negotiate("*"), compression.ENCODINGS[0])
+        self.assertIsNone(negotiate("gzip;q=0, identity"))
+        self.assertIsNone(negotiate(""))
+        self.assertEqual(negotiate("br;q=0.5, gzip;q=0.8"), "gzip")
+        if brotli is None:
+            self.assertIsNone(negotiate("br"))
+        else:
+            self.assertEqual(negotiate("gzip, br"), "br")
+
+    @unittest.skipIf(brotli is None, "brotli is not installed")
+    def test_brotli(self):
+        """
+        Ensure brotli is preferred when the client accepts it.
+        """
+        plain = self.client.get("/products")
+        response = self.client.get("/products", HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(response.content), plain.content)
@@ -0,0 +1,37 @@
+import json
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+
+@override_settings(REQUEST_INSTRUMENTATION=True, REQUEST_QUERY_THRESHOLD=None)
+class InstrumentationTests(APITestCase):
+    def setUp(self) -> None:
+        """
+        Create a new account
+        """
+        url = "/register"
+        data = {"username": "steve", "password": "Admin8*", "email": "steve@stevebrownlee.com",
+                "address": "100 Infinity Way", "phone_number": "555-1212", "first_name": "Steve", "last_name": "Brownlee"}
+        response = self.client.post(url, data, format='json')
+        json_response = json.loads(response.content)
+        self.token = json_response["token"]
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_server_timing_header(self):
+        """
+        Ensure responses report their query count and timings.
+        """
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+        with self.settings(REQUEST_QUERY_THRESHOLD=1), \
+                self.assertLogs('bangazonapi.requests', level='WARNING') as logs:
+            response = self.client.get("/paymenttypes")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timing = response["Server-Timing"]
+        self.assertIn('db;dur=', timing)
+        self.assertIn('desc="2 queries"', timing)
+        self.assertIn('render;dur=', timing)
+        self.assertIn('queries=2', logs.output[0])
+        self.assertIn('path=/paymenttypes', logs.output[0])
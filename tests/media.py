@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+from django.test import SimpleTestCase, override_settings
+from rest_framework import status
+
+
+class MediaTests(SimpleTestCase):
+    def setUp(self) -> None:
+        """
+        Create a media directory holding a hashed and a plain file
+        """
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.hashed = "products/ab/" + "ab" * 32 + "-thumb.webp"
+        self.content = bytes(range(256)) * 4
+
+        os.makedirs(os.path.join(self.media_root, "products", "ab"))
+        for name in (self.hashed, "products/kite.png"):
+            with open(os.path.join(self.media_root, name), "wb") as media_file:
+                media_file.write(self.content)
+
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_SENDFILE=None)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_serve_media_with_cache_headers(self):
+        """
+        Ensure files are sent with validators and hashed names are cached as immutable.
+        """
+        response = self.client.get("/media/" + self.hashed)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+        self.assertEqual(response["Content-Type"], "image/webp")
+        self.assertEqual(response["Content-Length"], "1024")
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+
+        response = self.client.get("/media/" + self.hashed, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get("/media/products/kite.png")
+        self.assertEqual(response["Cache-Control"], "public, max-age=3600")
+
+        self.assertEqual(self.client.get("/media/products/missing.png").status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get("/media/products/../../manage.py").status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post("/media/products/kite.png").status_code,
+                         status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    def test_serve_media_byte_ranges(self):
+        """
+        Ensure single byte ranges are honoured and unsatisfiable ones are refused.
+        """
+        response = self.client.get("/media/products/kite.png", HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response["Content-Range"], "bytes 10-19/1024")
+        self.assertEqual(b"".join(response.streaming_content), self.content[10:20])
+
+        response = self.client.get("/media/products/kite.png", HTTP_RANGE="bytes=-4")
+        self.assertEqual(b"".join(response.streaming_content), self.content[-4:])
+
+        response = self.client.get("/media/products/kite.png", HTTP_RANGE="bytes=1000-")
+        self.assertEqual(response["Content-Range"], "bytes 1000-1023/1024")
+
+        response = self.client.get("/media/products/kite.png", HTTP_RANGE="bytes=2000-")
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response["Content-Range"], "bytes */1024")
+
+        response = self.client.get("/media/products/kite.png", HTTP_RANGE="bytes=10-19", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_serve_media_through_web_server(self):
+        """
+        Ensure sendfile modes hand the file to the web server with the same headers.
+        """
+        with override_settings(MEDIA_SENDFILE="x-accel-redirect"):
+            response = self.client.get("/media/" + self.hashed)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/" + self.hashed)
+        self.assertEqual(response.content, b"")
+        self.assertIn("immutable", response["Cache-Control"])
+
+        with override_settings(MEDIA_SENDFILE="x-sendfile"):
+            response = self.client.get("/media/products/kite.png")
+        self.assertEqual(response["X-Sendfile"], os.path.join(self.media_root, "products", "kite.png"))
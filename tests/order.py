@@ -1,6 +1,12 @@
+import datetime
 import json
+from io import StringIO
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
 from rest_framework import status
 from rest_framework.test import APITestCase
+from bangazonapi.authentication import token_cache
+from bangazonapi.models import Customer, Order, OrderProduct, Payment, Product, SellerSalesDaily
 
 
 class OrderTests(APITestCase):
@@ -79,6 +85,275 @@ class OrderTests(APITestCase):
         self.assertEqual(json_response["size"], 0)
         self.assertEqual(len(json_response["lineitems"]), 0)
 
-    # TODO: Complete order by adding payment type
+    def test_list_orders_with_fixed_query_count(self):
+        """
+        Ensure listing orders does not run queries per order or per line item.
+        """
+        customer = Customer.objects.get(user__username="steve")
+        product = Product.objects.get(pk=1)
+        payment = Payment.objects.create(
+            merchant_name="Visa", account_number="1111", customer=customer,
+            expiration_date="2030-01-01", create_date=datetime.date.today())
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+        for total_orders in (1, 10, 100):
+            OrderProduct.objects.filter(order__customer=customer).delete()
+            Order.objects.filter(customer=customer).delete()
+            for _ in range(total_orders):
+                order = Order.objects.create(customer=customer, created_date=datetime.date.today())
+                OrderProduct.objects.bulk_create([
+                    OrderProduct(order=order, product=product) for _ in range(3)
+                ])
+                order.payment_type = payment
+                order.save()
+
+            # Token with user and customer, count, orders page, line items
+            token_cache.clear()
+            with self.assertNumQueries(4):
+                response = self.client.get("/orders?limit=100&expand=lineitems")
+
+            json_response = json.loads(response.content)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(json_response["results"]), total_orders)
+            self.assertEqual(len(json_response["results"][0]["lineitems"]), 3)
+
+    def test_order_history_filters_and_summary(self):
+        """
+        Ensure orders can be filtered by date, status and payment, and list as summaries by default.
+        """
+        customer = Customer.objects.get(user__username="steve")
+        visa, amex = (Payment.objects.create(
+            merchant_name=name, account_number="1111", customer=customer,
+            expiration_date="2030-01-01", create_date=datetime.date.today()) for name in ("Visa", "Amex"))
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+        for day, payment, lines in (("2019-01-10", visa, 2), ("2019-06-10", amex, 1), ("2020-01-10", None, 3)):
+            order = Order.objects.create(customer=customer, created_date=day)
+            OrderProduct.objects.bulk_create(OrderProduct(order=order, product_id=1) for _ in range(lines))
+            order.payment_type = payment
+            order.save()
+
+        # Token with user and customer, count, orders page with totals
+        token_cache.clear()
+        with self.assertNumQueries(3):
+            response = self.client.get("/orders")
+        results = json.loads(response.content)["results"]
+        self.assertEqual(results[0], {
+            "id": 1, "url": "http://testserver/orders/1", "created_date": "2019-01-10",
+            "payment_type": f"http://testserver/paymenttypes/{visa.id}",
+            "status": "paid", "size": 2, "total": 29.98,
+        })
+
+        def order_ids(query):
+            response = self.client.get(f"/orders?{query}")
+            self.assertEqual(response.status_code, status.HTTP_200_OK, query)
+            return [order["id"] for order in json.loads(response.content)["results"]]
+
+        self.assertEqual(order_ids("from=2019-06-01"), [2, 3])
+        self.assertEqual(order_ids("from=2019-01-01&to=2019-12-31"), [1, 2])
+        self.assertEqual(order_ids("status=paid"), [1, 2])
+        self.assertEqual(order_ids("status=open"), [3])
+        self.assertEqual(order_ids(f"payment_id={amex.id}"), [2])
+
+        response = self.client.get("/orders?status=open&expand=lineitems")
+        self.assertEqual(len(json.loads(response.content)["results"][0]["lineitems"]), 3)
+
+        response = self.client.get("/orders?status=open&fields=id,total")
+        self.assertEqual(json.loads(response.content)["results"], [{"id": 3, "total": 44.97}])
+
+        for query in ("status=shipped", "from=last-year", "expand=products", "payment_id=abc"):
+            response = self.client.get(f"/orders?{query}")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+        self.assertIn("payment_id", json.loads(response.content)["message"])
+
+    def test_cart_totals_with_fixed_query_count(self):
+        """
+        Ensure the cart is built in the same number of queries however many lines it has.
+        """
+        customer = Customer.objects.get(user__username="steve")
+        kite = Product.objects.get(pk=1)
+        ball = Product.objects.create(
+            name="Ball", price=2.5, quantity=10, description="Bounces", category_id=1,
+            location="Nashville", customer=customer)
+        order = Order.objects.create(customer=customer, created_date=datetime.date.today())
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+        for kites, balls in ((1, 0), (100, 100)):
+            OrderProduct.objects.filter(order=order).delete()
+            OrderProduct.objects.bulk_create(
+                [OrderProduct(order=order, product=kite) for _ in range(kites)] +
+                [OrderProduct(order=order, product=ball) for _ in range(balls)])
+
+            # Token with user and customer, order with totals, line items, quantities
+            token_cache.clear()
+            with self.assertNumQueries(4):
+                response = self.client.get("/cart")
+
+            json_response = json.loads(response.content)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(json_response["size"], kites + balls)
+            self.assertEqual(len(json_response["products"]), kites + balls)
+            self.assertEqual(json_response["subtotal"], round(kites * 14.99 + balls * 2.5, 2))
+
+        self.assertEqual(json_response["quantities"], [
+            {"product": kite.id, "quantity": 100, "total": 1499.0},
+            {"product": ball.id, "quantity": 100, "total": 250.0},
+        ])
+
+    def test_batch_add_and_remove(self):
+        """
+        Ensure one batch request adds and removes many line items at once.
+        """
+        customer = Customer.objects.get(user__username="steve")
+        ball = Product.objects.create(
+            name="Ball", price=2.5, quantity=10, description="Bounces", category_id=1,
+            location="Nashville", customer=customer)
+
+        data = {"add": [{"product_id": 1, "quantity": 3}, {"product_id": ball.id}]}
+        self.client.credentials()
+        response = self.client.post("/cart/batch", data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        response = self.client.post("/cart/batch", data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content), {"added": 4, "removed": 0})
+
+        data = {"add": [{"product_id": ball.id, "quantity": 2}],
+                "remove": [{"product_id": 1, "quantity": 2}, {"product_id": ball.id, "quantity": 5}]}
+        response = self.client.post("/cart/batch", data, format="json")
+        self.assertEqual(json.loads(response.content), {"added": 2, "removed": 5})
+
+        response = self.client.get("/cart")
+        json_response = json.loads(response.content)
+        self.assertEqual(json_response["size"], 1)
+        self.assertEqual(json_response["quantities"], [{"product": 1, "quantity": 1, "total": 14.99}])
+
+        data = {"add": [{"product_id": 1}, {"product_id": 999}]}
+        response = self.client.post("/cart/batch", data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("999", json.loads(response.content)["message"])
+        self.assertEqual(OrderProduct.objects.filter(order__customer=customer).count(), 1)
+
+    def test_conditional_get_orders(self):
+        """
+        Ensure a repeated order list is answered with 304 until the orders change.
+        """
+        self.test_add_product_to_order()
+
+        response = self.client.get("/orders")
+        etag = response["ETag"]
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # The token is cached and nothing is read from the orders tables
+        with self.assertNumQueries(0):
+            response = self.client.get("/orders", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response.content, b"")
+
+        response = self.client.get("/orders?limit=1", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.client.post("/cart", {"product_id": 1}, format="json")
+        response = self.client.get("/orders", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_one_open_order_per_customer(self):
+        """
+        Ensure a customer can never have more than one open order.
+        """
+        customer = Customer.objects.get(user__username="steve")
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        self.client.post("/cart", {"product_id": 1}, format="json")
+        self.client.post("/profile/cart", {"product_id": 1}, format="json")
+
+        open_orders = Order.objects.filter(customer=customer, payment_type__isnull=True)
+        self.assertEqual(open_orders.count(), 1)
+        self.assertEqual(OrderProduct.objects.filter(order__in=open_orders).count(), 2)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Order.objects.create(customer=customer, created_date=datetime.date.today())
+
+    def test_complete_order_takes_stock(self):
+        """
+        Ensure paying for an order takes its products out of stock, and fails when they run out.
+        """
+        customer = Customer.objects.get(user__username="steve")
+        payment = Payment.objects.create(
+            merchant_name="Visa", account_number="1111", customer=customer,
+            expiration_date="2030-01-01", create_date=datetime.date.today())
+        Product.objects.filter(pk=1).update(quantity=3)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+        self.client.post("/cart/batch", {"add": [{"product_id": 1, "quantity": 2}]}, format="json")
+        order = Order.objects.get(customer=customer, payment_type__isnull=True)
+        response = self.client.put(f"/orders/{order.id}", {"payment_type": payment.id}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        product = Product.objects.get(pk=1)
+        self.assertEqual(product.quantity, 1)
+        self.assertEqual(product.number_sold, 2)
+        self.assertEqual(Order.objects.get(pk=order.id).payment_type_id, payment.id)
+
+        response = self.client.put(f"/orders/{order.id}", {"payment_type": payment.id}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        self.client.post("/cart/batch", {"add": [{"product_id": 1, "quantity": 2}]}, format="json")
+        order = Order.objects.get(customer=customer, payment_type__isnull=True)
+        response = self.client.put(f"/orders/{order.id}", {"payment_type": payment.id}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(json.loads(response.content)["failures"],
+                         [{"product": 1, "requested": 2, "available": 1}])
+        self.assertEqual(Product.objects.get(pk=1).quantity, 1)
+        self.assertIsNone(Order.objects.get(pk=order.id).payment_type_id)
+
+
+    def test_seller_sales_rollups(self):
+        """
+        Ensure paid orders roll up into the seller's sales, and a backfill gives the same rows.
+        """
+        customer = Customer.objects.get(user__username="steve")
+        payment = Payment.objects.create(
+            merchant_name="Visa", account_number="1111", customer=customer,
+            expiration_date="2030-01-01", create_date=datetime.date.today())
+        paddle = Product.objects.create(name="Paddle", price=9.99, description="Wooden", quantity=10,
+                                        location="Nashville", customer=customer, category_id=1)
+
+        for day, product_ids in (("2019-10-01", (1,)), ("2019-10-22", (paddle.id, paddle.id)),
+                                 ("2019-10-23", (1,)), ("2019-10-23", ())):
+            order = Order.objects.create(customer=customer, created_date=day)
+            OrderProduct.objects.bulk_create(
+                OrderProduct(order=order, product_id=product_id) for product_id in product_ids)
+            order.payment_type = payment
+            order.save()
+
+        response = self.client.get("/profile/sales?from=2019-10-01&to=2019-10-31&granularity=week")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        json_response = json.loads(response.content)
+        self.assertEqual((json_response["units"], json_response["revenue"]), (4, 49.96))
+        self.assertEqual(json_response["periods"], [
+            {"period": "2019-09-30", "units": 1, "revenue": 14.99},
+            {"period": "2019-10-21", "units": 3, "revenue": 34.97},
+        ])
+        self.assertEqual([(product["name"], product["units"]) for product in json_response["products"]],
+                         [("Kite", 2), ("Paddle", 2)])
+
+        response = self.client.get("/profile/sales?from=2019-10-02&to=2019-10-31")
+        self.assertEqual([period["period"] for period in json.loads(response.content)["periods"]],
+                         ["2019-10-22", "2019-10-23"])
+
+        rollups = set(SellerSalesDaily.objects.values_list("seller", "product", "day", "units", "revenue"))
+        call_command("backfill_seller_sales", "--chunk-size", "1", stdout=StringIO())
+        self.assertEqual(set(SellerSalesDaily.objects.values_list("seller", "product", "day", "units", "revenue")),
+                         rollups)
+
+        for query in ("granularity=year", "from=yesterday", "from=2019-10-31&to=2019-10-01"):
+            response = self.client.get(f"/profile/sales?{query}")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+
+        self.client.credentials()
+        self.assertEqual(self.client.get("/profile/sales").status_code, status.HTTP_401_UNAUTHORIZED)
 
     # TODO: New line item is not added to closed order
\ No newline at end of file
@@ -1,7 +1,20 @@
+import base64
+import csv
 import json
+import os
 import datetime
+import tempfile
+from io import BytesIO, StringIO
+from PIL import Image
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APITestCase
+from bangazonapi.models import Customer, Order, OrderProduct, Payment, Product, ProductCategory, ProductRating
+from bangazonapi.models import SimilarProducts
 
 
 class ProductTests(APITestCase):
@@ -93,7 +106,385 @@ class ProductTests(APITestCase):
         response = self.client.get(url, None, format='json')
         json_response = json.loads(response.content)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(json_response), 3)
+        self.assertEqual(json_response["count"], 3)
+        self.assertEqual(len(json_response["results"]), 3)
+
+    def test_paginate_products(self):
+        """
+        Ensure product lists are paged by limit/offset and by cursor.
+        """
+        for _ in range(5):
+            self.test_create_product()
+
+        response = self.client.get("/products?limit=2&offset=2")
+        json_response = json.loads(response.content)
+        self.assertEqual(json_response["count"], 5)
+        self.assertEqual([product["id"] for product in json_response["results"]], [3, 4])
+
+        response = self.client.get("/products?limit=1000")
+        json_response = json.loads(response.content)
+        self.assertEqual(len(json_response["results"]), 5)
+
+        seen = []
+        url = "/products?cursor=&limit=2"
+        while url is not None:
+            json_response = json.loads(self.client.get(url).content)
+            seen.extend(product["id"] for product in json_response["results"])
+            url = json_response["next"]
+        self.assertEqual(seen, [5, 4, 3, 2, 1])
+
+        json_response = json.loads(self.client.get(json_response["previous"]).content)
+        self.assertEqual([product["id"] for product in json_response["results"]], [3, 2])
+
+        response = self.client.get("/products?quantity=2&limit=1")
+        self.assertEqual(json.loads(response.content)["count"], 2)
+
+        for query in ("quantity=2&cursor=", "quantity=two"):
+            response = self.client.get(f"/products?{query}")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+
+        # A cursor whose date is not a date is as invalid as any other bad cursor
+        cursor = base64.b64encode(b"d=notadate&i=5").decode()
+        for url in ("/products", "/orders"):
+            response = self.client.get(f"{url}?cursor={cursor}")
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, url)
+
+    def test_product_aggregates_follow_sales_and_ratings(self):
+        """
+        Ensure number_sold and average_rating track paid orders and ratings.
+        """
+        self.test_create_product()
+        product = Product.objects.get(pk=1)
+        customer = Customer.objects.get(user__username="steve")
+
+        order = Order.objects.create(customer=customer, created_date=datetime.date.today())
+        OrderProduct.objects.create(order=order, product=product)
+        OrderProduct.objects.create(order=order, product=product)
+        ProductRating.objects.create(product=product, customer=customer, rating=4)
+        ProductRating.objects.create(product=product, customer=customer, rating=5)
+
+        response = self.client.get("/products/1")
+        json_response = json.loads(response.content)
+        self.assertEqual(json_response["number_sold"], 0)
+        self.assertEqual(json_response["average_rating"], 4.5)
+
+        order.payment_type = Payment.objects.create(
+            merchant_name="Visa", account_number="1111", customer=customer,
+            expiration_date="2030-01-01", create_date=datetime.date.today())
+        order.save()
+
+        response = self.client.get("/products/1")
+        json_response = json.loads(response.content)
+        self.assertEqual(json_response["number_sold"], 2)
+
+        Product.objects.filter(pk=1).update(sold_count=0, rating_sum=0, rating_count=0)
+        call_command("rebuild_product_aggregates", stdout=StringIO())
+
+        product.refresh_from_db()
+        self.assertEqual(product.number_sold, 2)
+        self.assertEqual(product.average_rating, 4.5)
+
+    def test_filter_and_sort_products_by_aggregates(self):
+        """
+        Ensure number_sold and min_rating filters and aggregate sorting run in the database.
+        """
+        self.test_create_product()
+        self.test_create_product()
+        self.test_create_product()
+        Product.objects.filter(pk=1).update(sold_count=5, rating_sum=4, rating_count=2)
+        Product.objects.filter(pk=2).update(sold_count=1, rating_sum=9, rating_count=2)
+        Product.objects.filter(pk=3).update(sold_count=3)
+        self.client.credentials()
+
+        # One COUNT for the page links, one SELECT for the page
+        with self.assertNumQueries(2):
+            response = self.client.get("/products?number_sold=3")
+        json_response = json.loads(response.content)
+        self.assertEqual([product["id"] for product in json_response["results"]], [2, 3])
+
+        response = self.client.get("/products?min_rating=2")
+        json_response = json.loads(response.content)
+        self.assertEqual([product["id"] for product in json_response["results"]], [1, 2])
+        self.assertEqual(json_response["results"][1]["average_rating"], 4.5)
+
+        response = self.client.get("/products?order_by=number_sold&direction=desc")
+        json_response = json.loads(response.content)
+        self.assertEqual([product["id"] for product in json_response["results"]], [1, 3, 2])
+
+        for query in ("number_sold=many", "min_rating=x", "number_sold=2.5"):
+            response = self.client.get(f"/products?{query}")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+
+    def test_sparse_fieldsets(self):
+        """
+        Ensure fields, omit and expand pick the product fields and prune the query.
+        """
+        self.test_create_product()
+        self.test_create_product()
+        self.client.credentials()
+
+        # One COUNT for the page links, one SELECT for the page
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/products?fields=id,name,price")
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn("description", queries[1]["sql"])
+        self.assertNotIn("rating_sum", queries[1]["sql"])
+        self.assertEqual(json.loads(response.content)["results"][0], {"id": 1, "name": "Kite", "price": 14.99})
+
+        response = self.client.get("/products/2?omit=description,images,can_be_rated")
+        product = json.loads(response.content)
+        self.assertEqual(product["id"], 2)
+        self.assertNotIn("description", product)
+        self.assertNotIn("images", product)
+        self.assertEqual(product["average_rating"], 0)
+
+        # The category is joined into the page query
+        with self.assertNumQueries(2):
+            response = self.client.get("/products?expand=category&fields=id,category")
+        self.assertEqual(json.loads(response.content)["results"][1], {
+            "id": 2,
+            "category": {"id": 1, "url": "http://testserver/productcategories/1", "name": "Sporting Goods"},
+        })
+
+        response = self.client.get("/products?fields=id&cursor=")
+        json_response = json.loads(response.content)
+        self.assertEqual(json_response["results"], [{"id": 2}, {"id": 1}])
+        self.assertIsNone(json_response["next"])
+
+        for query in ("fields=id,secret", "omit=category", "expand=customer"):
+            response = self.client.get(f"/products?{query}")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+        response = self.client.get("/products/1?fields=secret")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_products(self):
+        """
+        Ensure ?q= returns ranked matches and skips deleted products.
+        """
+        url = "/products"
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        for name, description in (("Kite", "It flies high"),
+                                  ("Box kite", "A kite shaped like a kite box"),
+                                  ("Yo-yo", "Walk the dog")):
+            data = {"name": name, "price": 9.99, "quantity": 5, "description": description,
+                    "category_id": 1, "location": "Pittsburgh"}
+            self.client.post(url, data, format='json')
+
+        response = self.client.get("/products?q=kite")
+        json_response = json.loads(response.content)
+        self.assertEqual(json_response["count"], 2)
+        self.assertEqual([product["id"] for product in json_response["results"]], [2, 1])
+
+        response = self.client.get("/products?q=pitts")
+        json_response = json.loads(response.content)
+        self.assertEqual(json_response["count"], 3)
+
+        self.client.delete("/products/2")
+        response = self.client.get("/products?q=kite")
+        json_response = json.loads(response.content)
+        self.assertEqual([product["id"] for product in json_response["results"]], [1])
+
+    def test_product_detail_cache(self):
+        """
+        Ensure product detail is served from cache until the product, a rating or a sale changes it.
+        """
+        with tempfile.TemporaryDirectory() as cache_dir, override_settings(CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            "responses": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                          "LOCATION": cache_dir},
+        }):
+            self.test_create_product()
+            self.client.credentials()
+            customer = Customer.objects.get(user__username="steve")
+
+            self.client.get("/products/1")
+            with self.assertNumQueries(0):
+                response = self.client.get("/products/1")
+            self.assertEqual(json.loads(response.content)["average_rating"], 0)
+
+            ProductRating.objects.create(product_id=1, customer=customer, rating=3)
+            response = self.client.get("/products/1")
+            self.assertEqual(json.loads(response.content)["average_rating"], 3)
+
+            order = Order.objects.create(customer=customer, created_date=datetime.date.today())
+            OrderProduct.objects.create(order=order, product_id=1)
+            order.payment_type = Payment.objects.create(
+                merchant_name="Visa", account_number="1111", customer=customer,
+                expiration_date="2030-01-01", create_date=datetime.date.today())
+            order.save()
+            response = self.client.get("/products/1")
+            self.assertEqual(json.loads(response.content)["number_sold"], 1)
+
+            Product.objects.get(pk=1).delete()
+            response = self.client.get("/products/1")
+            self.assertNotEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_expanded_category_is_invalidated(self):
+        """
+        Ensure responses that expand the category change when the category is renamed.
+        """
+        with tempfile.TemporaryDirectory() as cache_dir, override_settings(CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            "responses": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                          "LOCATION": cache_dir},
+        }):
+            self.test_create_product()
+            self.client.credentials()
+
+            etags = {}
+            for url in ("/products/1?expand=category", "/products?expand=category"):
+                response = self.client.get(url)
+                etags[url] = response["ETag"]
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED, url)
+
+            category = ProductCategory.objects.get(pk=1)
+            category.name = "Toys"
+            category.save()
+
+            responses = {url: self.client.get(url, HTTP_IF_NONE_MATCH=etag) for url, etag in etags.items()}
+            for response in responses.values():
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+            detail = json.loads(responses["/products/1?expand=category"].content)
+            self.assertEqual(detail["category"]["name"], "Toys")
+            listed = json.loads(responses["/products?expand=category"].content)
+            self.assertEqual(listed["results"][0]["category"]["name"], "Toys")
+
+    def test_export_products(self):
+        """
+        Ensure the catalog streams out as NDJSON and CSV with the list fields.
+        """
+        for _ in range(3):
+            self.test_create_product()
+        listed = json.loads(self.client.get("/products").content)["results"]
+
+        response = self.client.get("/products/export")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        exported = [json.loads(line) for line in lines]
+        self.assertEqual(exported, [
+            {key: value for key, value in product.items() if key not in ("images", "can_be_rated")}
+            for product in listed
+        ])
+
+        response = self.client.get("/products/export?format=csv")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = list(csv.DictReader(StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual([row["id"] for row in rows], ["1", "2", "3"])
+        self.assertEqual(rows[0]["name"], "Kite")
+
+        response = self.client.get("/products/export?format=xml")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_create_product_with_image(self):
+        """
+        Ensure uploaded images are stored once under their hash with WebP variants.
+        """
+        image = Image.new("RGB", (800, 600), "orange")
+        png = BytesIO()
+        image.save(png, "PNG")
+        data = {"name": "Kite", "price": 14.99, "quantity": 60, "description": "It flies high",
+                "category_id": 1, "location": "Pittsburgh"}
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root, PRODUCT_IMAGE_WORKERS=0):
+            upload = SimpleUploadedFile("kite.png", png.getvalue(), content_type="image/png")
+            response = self.client.post("/products", dict(data, image_path=upload), format='multipart')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            product = json.loads(response.content)
+
+            name = Product.objects.get(pk=product["id"]).image_path.name
+            self.assertRegex(name, r"^products/[0-9a-f]{2}/[0-9a-f]{64}\.png$")
+            self.assertTrue(product["image_path"].endswith(name))
+            self.assertTrue(product["images"]["thumb"].endswith(name[:-4] + "-thumb.webp"))
+
+            with Image.open(os.path.join(media_root, name[:-4] + "-thumb.webp")) as thumb:
+                self.assertEqual((thumb.format, thumb.size), ("WEBP", (320, 240)))
+            with Image.open(os.path.join(media_root, name[:-4] + ".webp")) as full:
+                self.assertEqual(full.size, (800, 600))
+
+            # The same image sent as base64 reuses the stored files
+            encoded = "data:image/png;base64," + base64.b64encode(png.getvalue()).decode()
+            response = self.client.post("/products", dict(data, image_path=encoded), format='json')
+            product = json.loads(response.content)
+            self.assertEqual(Product.objects.get(pk=product["id"]).image_path.name, name)
+            self.assertEqual(len(os.listdir(os.path.dirname(os.path.join(media_root, name)))), 3)
+
+            # Invalid images are dropped and the product is kept
+            with self.assertLogs('bangazonapi.images', 'WARNING'):
+                response = self.client.post("/products", dict(data, image_path="data:image/png;base64,bm9wZQ=="),
+                                            format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertIsNone(json.loads(response.content)["image_path"])
+
+    def test_backfill_product_images(self):
+        """
+        Ensure images stored before the pipeline get their WebP variants from the backfill.
+        """
+        png = BytesIO()
+        Image.new("RGB", (800, 600), "orange").save(png, "PNG")
+        self.test_create_product()
+        self.test_create_product()
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            os.makedirs(os.path.join(media_root, "legacy"))
+            with open(os.path.join(media_root, "legacy", "kite.png"), "wb") as legacy:
+                legacy.write(png.getvalue())
+            Product.objects.filter(pk=1).update(image_path="legacy/kite.png")
+            Product.objects.filter(pk=2).update(image_path="legacy/missing.png")
+
+            stderr = StringIO()
+            call_command("backfill_product_images", stdout=StringIO(), stderr=stderr)
+            self.assertIn("legacy/missing.png", stderr.getvalue())
+            with Image.open(os.path.join(media_root, "legacy", "kite-thumb.webp")) as thumb:
+                self.assertEqual((thumb.format, thumb.size), ("WEBP", (320, 240)))
+            with Image.open(os.path.join(media_root, "legacy", "kite.webp")) as full:
+                self.assertEqual(full.size, (800, 600))
+
+            images = json.loads(self.client.get("/products/1").content)["images"]
+            self.assertTrue(images["full"].endswith("/legacy/kite.webp"))
+
+            # Variants already written are left alone
+            stdout = StringIO()
+            call_command("backfill_product_images", stdout=stdout, stderr=StringIO())
+            self.assertIn("Wrote 0 image variants", stdout.getvalue())
+
+    def test_similar_products(self):
+        """
+        Ensure paid orders build the also-bought lists, and a rebuild gives the same result.
+        """
+        for _ in range(4):
+            self.test_create_product()
+        customer = Customer.objects.get(user__username="steve")
+        payment = Payment.objects.create(
+            merchant_name="Visa", account_number="1111", customer=customer,
+            expiration_date="2030-01-01", create_date=datetime.date.today())
+
+        for product_ids in ((1, 2, 3), (1, 2), (4, 1, 4), (2, 3)):
+            order = Order.objects.create(customer=customer, created_date=datetime.date.today())
+            OrderProduct.objects.bulk_create(
+                OrderProduct(order=order, product_id=product_id) for product_id in product_ids)
+            order.payment_type = payment
+            order.save()
+
+        def similar(url):
+            return [product["id"] for product in json.loads(self.client.get(url).content)]
+
+        self.assertEqual(similar("/products/1/similar"), [2, 3, 4])
+        self.assertEqual(similar("/products/2/similar"), [1, 3])
+        self.assertEqual(similar("/products/1/similar?limit=1"), [2])
+
+        lists = dict(SimilarProducts.objects.values_list("product", "neighbors"))
+        call_command("rebuild_similar_products", stdout=StringIO())
+        self.assertEqual(dict(SimilarProducts.objects.values_list("product", "neighbors")), lists)
+
+        self.client.delete("/products/3")
+        self.assertEqual(similar("/products/1/similar"), [2, 4])
+        self.assertEqual(self.client.get("/products/99/similar").status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get("/products/abc/similar").status_code, status.HTTP_404_NOT_FOUND)
 
     # TODO: Delete product
 
@@ -0,0 +1,83 @@
+import json
+import unittest
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from bangazonapi.renderers import ORJSONRenderer, msgpack
+
+
+class RendererTests(APITestCase):
+    def setUp(self) -> None:
+        """
+        Create an account, a category and a product
+        """
+        data = {"username": "steve", "password": "Admin8*", "email": "steve@stevebrownlee.com",
+                "address": "100 Infinity Way", "phone_number": "555-1212", "first_name": "Steve", "last_name": "Brownlee"}
+        response = self.client.post("/register", data, format='json')
+        self.token = json.loads(response.content)["token"]
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+        self.client.post("/productcategories", {"name": "Sporting Goods"}, format='json')
+        self.product = {
+            "name": "Kite \u2028 \u00e9t\u00e9",
+            "price": 14.99,
+            "quantity": 60,
+            "description": "It flies high",
+            "category_id": 1,
+            "location": "Pittsburgh"
+        }
+        response = self.client.post("/products", self.product, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_json_matches_drf_renderer(self):
+        """
+        Ensure the orjson renderer sends the same bytes as DRF's JSON renderer.
+        """
+        response = self.client.get("/products")
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+        self.assertIn(b"Kite \\u2028 \xc3\xa9t\xc3\xa9", response.content)
+
+        response = self.client.post("/products", b'{"name": ', content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(json.loads(response.content)["detail"].startswith("JSON parse error"))
+
+    def test_json_out_of_range_floats(self):
+        """
+        Ensure NaN and Infinity render as null, where DRF's JSON renderer refuses them.
+        """
+        data = {"nan": float("nan"), "inf": float("inf"), "-inf": float("-inf"), "price": 14.99}
+        self.assertEqual(ORJSONRenderer().render(data), b'{"nan":null,"inf":null,"-inf":null,"price":14.99}')
+        with self.assertRaises(ValueError):
+            JSONRenderer().render(data)
+
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    def test_messagepack_responses_and_requests(self):
+        """
+        Ensure MessagePack is negotiated for responses and parsed from request bodies.
+        """
+        response = self.client.get("/products/1", HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        product = msgpack.unpackb(response.content, raw=False)
+        self.assertEqual(product["name"], self.product["name"])
+        self.assertEqual(product["price"], 14.99)
+
+        response = self.client.get("/products?format=msgpack")
+        self.assertEqual(msgpack.unpackb(response.content, raw=False)["count"], 1)
+
+        response = self.client.post("/products", msgpack.packb(dict(self.product, name="Bat")),
+                                    content_type="application/msgpack")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(json.loads(response.content)["name"], "Bat")
+
+        response = self.client.post("/products", b"\xc1", content_type="application/msgpack")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @unittest.skipIf(msgpack is not None, "msgpack is installed")
+    def test_messagepack_needs_msgpack(self):
+        """
+        Ensure MessagePack is not offered without the msgpack package.
+        """
+        response = self.client.get("/products", HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response.status_code, status.HTTP_406_NOT_ACCEPTABLE)
@@ -0,0 +1,41 @@
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from bangazonapi.models import CoPurchase, Customer, Favorite, Order, OrderProduct, Product, SellerSalesDaily
+
+
+class SeedingTests(TestCase):
+    def test_bulk_loaddata_matches_fixtures(self):
+        """
+        Ensure bulk_loaddata loads every fixture in foreign key order.
+        """
+        # Children are listed before their parents on purpose
+        call_command("bulk_loaddata", "order_product", "favoritesellers", "order", "payment",
+                     "productrating", "product", "product_category", "customers", "tokens", "users",
+                     stdout=StringIO())
+
+        self.assertEqual(User.objects.count(), 4)
+        self.assertEqual(Customer.objects.count(), 4)
+        self.assertEqual(Favorite.objects.count(), 3)
+        self.assertEqual(Order.objects.count(), 10)
+
+        # Repeated primary keys in a fixture replace the earlier row, as with loaddata
+        self.assertEqual(Product.objects.count(), 144)
+        self.assertEqual(OrderProduct.objects.count(), 9)
+
+        sold = OrderProduct.objects.filter(order__payment_type__isnull=False).count()
+        self.assertEqual(sum(Product.objects.values_list("sold_count", flat=True)), sold)
+
+        # The co-purchase counts are rebuilt from the loaded orders
+        pairs = set(CoPurchase.objects.values_list("product_id", "other_id", "orders"))
+        self.assertTrue(pairs)
+        call_command("rebuild_similar_products", stdout=StringIO())
+        self.assertEqual(set(CoPurchase.objects.values_list("product_id", "other_id", "orders")), pairs)
+
+        # And so are the seller sales rollups
+        rollups = set(SellerSalesDaily.objects.values_list("seller_id", "product_id", "day", "units", "revenue"))
+        self.assertTrue(rollups)
+        call_command("backfill_seller_sales", stdout=StringIO())
+        self.assertEqual(
+            set(SellerSalesDaily.objects.values_list("seller_id", "product_id", "day", "units", "revenue")), rollups)